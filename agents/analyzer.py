@@ -1,3 +1,4 @@
+import asyncio
 from typing import Dict
 from langchain_openai import OpenAI
 from langchain.chains import LLMChain
@@ -45,13 +46,20 @@ class AnalyzerAgent:
 
     async def analyze(self, data: Dict) -> Dict:
         """
-        Analyze collected data using LLM
+        Analyze collected data using LLM. The sub-analyses are independent,
+        so they run concurrently.
         """
+        swot, features, positioning, advantages = await asyncio.gather(
+            self._generate_swot(data),
+            self._compare_features(data),
+            self._analyze_positioning(data),
+            self._identify_advantages(data)
+        )
         analysis_results = {
-            "swot_analysis": await self._generate_swot(data),
-            "feature_comparison": await self._compare_features(data),
-            "market_positioning": await self._analyze_positioning(data),
-            "competitive_advantages": await self._identify_advantages(data)
+            "swot_analysis": swot,
+            "feature_comparison": features,
+            "market_positioning": positioning,
+            "competitive_advantages": advantages
         }
         return analysis_results
 
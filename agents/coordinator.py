@@ -1,26 +1,117 @@
-from typing import List
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
 from .data_collector import DataCollectorAgent
 from .analyzer import AnalyzerAgent
 from .report_generator import ReportGeneratorAgent
 from models.competitor import CompetitorProfile, CompetitorReport
 from models.request import AnalysisRequest
+from scraper.deadline import Deadline
 
 class CompetitorAnalysisCoordinator:
+    """
+    Runs requests through collect -> analyze -> report as a staged pipeline.
+
+    Each stage has its own pool of workers reading from a bounded queue, so
+    one request's LLM analysis overlaps with other requests' data collection
+    and report generation. When a stage falls behind its input queue fills
+    up and run_analysis() waits to submit, which bounds the number of
+    requests (and their collected data) held in memory.
+
+    A request's latency budget starts when it is submitted and covers every
+    stage, including time spent queued. Data collection returns whatever
+    sources answered in time; analysis and report generation are cancelled
+    when the budget runs out, and run_analysis() raises DeadlineExceeded.
+    """
+
     def __init__(self, data_collector: DataCollectorAgent,
                  analyzer: AnalyzerAgent,
-                 report_generator: ReportGeneratorAgent):
+                 report_generator: ReportGeneratorAgent,
+                 collector_workers: int = 4,
+                 analyzer_workers: int = 2,
+                 report_workers: int = 1,
+                 queue_size: int = 8):
         self.data_collector = data_collector
         self.analyzer = analyzer
         self.report_generator = report_generator
+        self.queue_size = queue_size
+
+        # (stage function, worker count, whether the stage is cut off at the
+        # deadline) in pipeline order. Collection applies the budget itself
+        # so that it can return partial data.
+        self.stages: List[Tuple[Callable[[Any], Awaitable[Any]], int, bool]] = [
+            (self.data_collector.collect_data, collector_workers, False),
+            (self.analyzer.analyze, analyzer_workers, True),
+            (self.report_generator.generate_report, report_workers, True)
+        ]
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        # Callers waiting to submit a request to a full pipeline
+        self._submitting: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start the stage workers; run_analysis() calls this on first use"""
+        if self._workers:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        for index, (stage, workers, bounded) in enumerate(self.stages):
+            next_queue = self._queues[index + 1] if index + 1 < len(self.stages) else None
+            for _ in range(workers):
+                self._workers.append(asyncio.create_task(
+                    self._run_stage(stage, bounded, self._queues[index], next_queue)
+                ))
+
+    async def stop(self) -> None:
+        """Cancel the workers; requests still in the pipeline are cancelled too"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for queue in self._queues:
+            while not queue.empty():
+                _, future, _ = queue.get_nowait()
+                future.cancel()
+        # Including callers still waiting to submit to a full pipeline
+        for task in self._submitting:
+            task.cancel()
+        self._workers = []
+        self._queues = []
+
+    async def _run_stage(self, stage: Callable[[Any], Awaitable[Any]], bounded: bool,
+                         queue: asyncio.Queue, next_queue: Optional[asyncio.Queue]) -> None:
+        while True:
+            data, future, deadline = await queue.get()
+            try:
+                # Skip requests whose caller has gone away
+                if future.done():
+                    continue
+                try:
+                    with deadline:
+                        result = await (deadline.run(stage(data)) if bounded else stage(data))
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if next_queue is None:
+                    if not future.done():
+                        future.set_result(result)
+                else:
+                    await next_queue.put((result, future, deadline))
+            except asyncio.CancelledError:
+                # The worker is being stopped while running this request or
+                # handing it on; don't leave its caller waiting
+                future.cancel()
+                raise
+            finally:
+                queue.task_done()
 
     async def run_analysis(self, request: AnalysisRequest) -> CompetitorReport:
-        # Step 1: Collect raw data
-        raw_data = await self.data_collector.collect_data(request)
-        
-        # Step 2: Analyze collected data
-        analyzed_data = await self.analyzer.analyze(raw_data)
-        
-        # Step 3: Generate final report
-        report = await self.report_generator.generate_report(analyzed_data)
-        
-        return report
\ No newline at end of file
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        deadline = Deadline.from_ms(request.latency_budget_ms)
+        task = asyncio.current_task()
+        self._submitting.add(task)
+        try:
+            # Waits here while the pipeline is full
+            await self._queues[0].put((request, future, deadline))
+        finally:
+            self._submitting.discard(task)
+        return await future
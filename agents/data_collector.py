@@ -1,8 +1,10 @@
 from typing import List, Dict
 import aiohttp
+from aiohttp.client import DEFAULT_TIMEOUT
 import asyncio
 from bs4 import BeautifulSoup
 from models.request import AnalysisRequest
+from scraper.deadline import Deadline, current_deadline
 import os
 from dotenv import load_dotenv
 
@@ -21,20 +23,34 @@ class DataCollectorAgent:
 
     async def collect_data(self, request: AnalysisRequest) -> Dict:
         """
-        Collect data from multiple sources in parallel
+        Collect data from multiple sources in parallel. With a latency budget
+        on the request, sources that haven't answered when it runs out are
+        cancelled and listed under "pending_sources". The budget is what is
+        left of the current deadline (see CompetitorAnalysisCoordinator), or
+        the request's whole budget when called on its own.
         """
-        async with aiohttp.ClientSession() as session:
-            tasks = [
-                self._fetch_crunchbase_data(session, request),
-                self._fetch_linkedin_data(session, request),
-                self._fetch_g2_data(session, request)
-            ]
+        budget = (current_deadline() or Deadline.from_ms(request.latency_budget_ms)).remaining()
+        timeout = aiohttp.ClientTimeout(total=budget) if budget is not None else DEFAULT_TIMEOUT
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            tasks = {
+                "crunchbase": asyncio.create_task(self._fetch_crunchbase_data(session, request)),
+                "linkedin": asyncio.create_task(self._fetch_linkedin_data(session, request)),
+                "g2": asyncio.create_task(self._fetch_g2_data(session, request))
+            }
             
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            done, pending = await asyncio.wait(tasks.values(), timeout=budget)
+            for task in pending:
+                task.cancel()
+            # Let them finish cancelling before the session is closed
+            await asyncio.gather(*pending, return_exceptions=True)
             
             # Filter out any exceptions and combine successful results
-            valid_results = [r for r in results if not isinstance(r, Exception)]
+            valid_results = [
+                task.result() for task in tasks.values()
+                if task in done and not task.exception()
+            ]
             combined_data = self._normalize_data(valid_results)
+            combined_data["pending_sources"] = [name for name, task in tasks.items() if task in pending]
             return combined_data
 
     async def _fetch_crunchbase_data(self, session: aiohttp.ClientSession, request: AnalysisRequest) -> Dict:
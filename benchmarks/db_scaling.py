@@ -0,0 +1,223 @@
+"""
+DBManager scaling micro-benchmarks.
+
+For each store size the competitors and search_results collections are
+filled with synthetic documents (in the current storage format), then the
+benchmark measures:
+
+    get_search_results      hit and miss latency
+    get_competitor_data     hit latency
+    store_search_results    latency of single writes into the full store
+    store_competitor_data   latency of single writes into the full store
+    clear_old_data          time to sweep the store (10% of entries just past
+                            their TTL) and the entries left afterwards
+
+along with Python peak memory (tracemalloc) per operation, process max RSS
+and the on-disk footprint of ./data. Results are written as JSON so runs
+from different versions can be compared.
+
+Usage:
+    python -m benchmarks.db_scaling --sizes 10000 100000 --json db_scaling.json
+    python -m benchmarks.db_scaling --sizes 1000000 --samples 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from .load_benchmark import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+EXPIRED_FRACTION = 0.1
+
+def _search_results(i: int, stored_at: datetime) -> List[Dict]:
+    return [
+        {
+            "title": f"Result {j} for query {i}",
+            "url": f"https://example-{i}-{j}.com/page",
+            "snippet": f"Snippet {j} describing how product {i} helps teams collaborate and plan work.",
+            "analysis": f"Product {i} targets mid-sized teams; result {j} highlights integrations and pricing.",
+            "data_source": "cached",
+            "last_updated": stored_at.isoformat()
+        }
+        for j in range(5)
+    ]
+
+def _competitor(i: int, stored_at: datetime) -> Dict:
+    return {
+        "company_info": {"name": f"Company {i}", "website": f"https://company-{i}.com", "industry": "Software",
+                         "founded_year": 2010, "location": "Remote", "founders": None},
+        "market_position": {"target_audience": ["SMB", "Enterprise"], "brand_reputation": "Good",
+                            "value_propositions": ["Fast setup", "Integrations"]},
+        "product_service": {"features": ["Tasks", "Boards", "Reports"], "pricing": {"pro": "$10"},
+                            "differentiators": ["Automation"]},
+        "online_presence": {"website_traffic": None, "domain_authority": None, "social_media": {},
+                            "content_strategy": None},
+        "customer_sentiment": {"positive_feedback": ["Easy"], "negative_feedback": ["Slow"],
+                               "common_pain_points": ["Reporting"], "praise_points": ["UI"]},
+        "business_growth": {"funding_rounds": None, "revenue_estimates": None, "partnerships": [],
+                            "market_growth": "Growing"},
+        "tech_stack": {"tools": ["React"], "ai_ml_usage": None, "frameworks": ["Django"],
+                       "platform_details": "SaaS"},
+        "marketing_strategy": {"campaigns": [], "channels": ["Search"], "positioning": "Productivity",
+                               "engagement_metrics": None},
+        "data_source": "cached",
+        "last_updated": stored_at.isoformat()
+    }
+
+def fill(db_manager, size: int) -> float:
+    """Bulk load `size` search result and competitor documents; returns seconds taken"""
+    from scraper.db_manager import (
+        COMPETITOR_TTL_DAYS, DOCUMENT_FORMAT_VERSION, SEARCH_RESULTS_TTL_DAYS, encode_document
+    )
+
+    batch_size = min(db_manager.client.get_max_batch_size(), 5000)
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    for offset in range(0, size, batch_size):
+        indices = range(offset, min(offset + batch_size, size))
+        for collection, make_doc, make_key, ttl_days in [
+            (db_manager.search_results_collection, _search_results, lambda i: f"query {i}", SEARCH_RESULTS_TTL_DAYS),
+            (db_manager.competitors_collection, _competitor, lambda i: f"https://company-{i}.com", COMPETITOR_TTL_DAYS),
+        ]:
+            ids, documents, metadatas = [], [], []
+            for i in indices:
+                # Expired entries are just past their collection's TTL
+                expired = i % int(1 / EXPIRED_FRACTION) == 0
+                stored_at = now - timedelta(days=ttl_days + 1 if expired else 1)
+                document, raw_bytes = encode_document(make_doc(i, stored_at))
+                ids.append(db_manager._generate_id(make_key(i)))
+                documents.append(document)
+                metadatas.append({
+                    "stored_at": stored_at.isoformat(),
+                    "format_version": DOCUMENT_FORMAT_VERSION,
+                    "raw_bytes": raw_bytes
+                })
+            collection.upsert(
+                ids=ids,
+                embeddings=db_manager._placeholder_embeddings(collection, len(ids)),
+                documents=documents,
+                metadatas=metadatas
+            )
+    return time.perf_counter() - start
+
+def measure(loop: asyncio.AbstractEventLoop, operation: Callable, samples: int) -> Dict:
+    """Run an async operation `samples` times; report latency percentiles and peak memory"""
+    latencies = []
+    tracemalloc.start()
+    for i in range(samples):
+        start = time.perf_counter()
+        loop.run_until_complete(operation(i))
+        latencies.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "samples": samples,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "python_peak_mb": round(peak / 2**20, 2)
+    }
+
+def disk_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+def run_size(size: int, samples: int, seed: int) -> Dict:
+    # DBManager always opens ./data, so give every size its own directory
+    os.chdir(tempfile.mkdtemp(prefix=f"db-scaling-{size}-"))
+    from scraper.db_manager import DBManager
+
+    db_manager = DBManager()
+    loop = asyncio.new_event_loop()
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    result = {"size": size, "fill_s": round(fill(db_manager, size), 2)}
+    result["disk_bytes_after_fill"] = disk_bytes("./data")
+
+    def live_index() -> int:
+        # Lookups target entries that are not expired, so they are real hits
+        i = rng.randrange(size)
+        return i + 1 if i % int(1 / EXPIRED_FRACTION) == 0 and i + 1 < size else i
+
+    result["get_search_results_hit"] = measure(
+        loop, lambda _: db_manager.get_search_results(f"query {live_index()}"), samples)
+    result["get_search_results_miss"] = measure(
+        loop, lambda i: db_manager.get_search_results(f"missing query {i}"), samples)
+    result["get_competitor_data_hit"] = measure(
+        loop, lambda _: db_manager.get_competitor_data(f"https://company-{live_index()}.com"), samples)
+    result["store_search_results"] = measure(
+        loop, lambda i: db_manager.store_search_results(f"new query {i}", _search_results(size + i, now)), samples)
+    result["store_competitor_data"] = measure(
+        loop, lambda i: db_manager.store_competitor_data(_competitor(size + i, now)), samples)
+    result["clear_old_data"] = measure(loop, lambda _: db_manager.clear_old_data(), 1)
+    result["entries_after_sweep"] = {
+        "search_results": db_manager.search_results_collection.count(),
+        "competitors": db_manager.competitors_collection.count()
+    }
+
+    result["disk_bytes_after_sweep"] = disk_bytes("./data")
+    result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_in_subprocess(size: int, args: argparse.Namespace) -> Dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        path = f.name
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.db_scaling", "--sizes", str(size),
+         "--samples", str(args.samples), "--seed", str(args.seed), "--json", path],
+        cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL
+    )
+    with open(path) as f:
+        return json.load(f)["results"][0]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DBManager scaling micro-benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="number of entries per collection")
+    parser.add_argument("--samples", type=int, default=200, help="operations measured per benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.json) if args.json else None
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "results": []
+    }
+    for size in args.sizes:
+        # Each size runs in a fresh process so max RSS is per size
+        result = run_size(size, args.samples, args.seed) if len(args.sizes) == 1 else run_in_subprocess(size, args)
+        report["results"].append(result)
+        print(json.dumps(result))
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
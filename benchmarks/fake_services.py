@@ -0,0 +1,203 @@
+"""
+Local stand-ins for the external services used by DataCollector:
+
+    /customsearch/v1          Google Custom Search JSON API
+    /v1/chat/completions      OpenAI chat completions
+    /v1/embeddings            OpenAI embeddings (hashed bag of words)
+    /site/<name>              static competitor websites
+
+All of them are served by one aiohttp app. Latency, jitter and error rates are
+configurable so load tests can model slow or flaky upstreams without
+spending real quota. The app runs on its own thread and event loop so that
+blocking calls in the app under test cannot stall the fakes.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from aiohttp import web
+from pydantic import BaseModel
+
+class FakeServiceConfig(BaseModel):
+    llm_latency: float = 0.5        # mean seconds per chat completion
+    llm_jitter: float = 0.2         # +/- uniform jitter in seconds
+    llm_error_rate: float = 0.0     # fraction of chat completions answered with HTTP 500
+    llm_tail_rate: float = 0.0      # fraction of chat completions in the slow tail
+    llm_tail_multiplier: float = 4.0  # latency of slow-tail completions relative to the mean
+    google_latency: float = 0.1
+    google_error_rate: float = 0.0
+    google_duplicate_rate: float = 0.0  # fraction of search results repeating the previous one
+    site_latency: float = 0.05
+
+# One JSON object that satisfies every prompt DataCollector sends: content
+# analysis, competitor profile, SWOT and competitive analysis.
+_LLM_CONTENT = """{
+    "analysis": "The page positions the product for mid-sized teams and emphasises integrations.",
+    "points": ["Broad integration catalogue", "Simple onboarding"],
+    "strengths": ["Strong brand"], "weaknesses": ["Pricing complexity"],
+    "opportunities": ["AI features"], "threats": ["Low-cost entrants"],
+    "company_info": {"name": "Example Co", "website": "https://example.com", "industry": "Software",
+                     "founded_year": 2012, "location": "Remote", "founders": ["A. Founder"]},
+    "market_position": {"target_audience": ["SMB"], "brand_reputation": "Good",
+                        "value_propositions": ["Fast setup"]},
+    "product_service": {"features": ["Tasks", "Boards"], "pricing": {"pro": "$10"},
+                        "differentiators": ["Automation"]},
+    "online_presence": {"website_traffic": null, "domain_authority": null, "social_media": {},
+                        "content_strategy": null},
+    "customer_sentiment": {"positive_feedback": ["Easy"], "negative_feedback": ["Slow"],
+                           "common_pain_points": ["Reporting"], "praise_points": ["UI"]},
+    "business_growth": {"funding_rounds": null, "revenue_estimates": null, "partnerships": [],
+                        "market_growth": "Growing"},
+    "tech_stack": {"tools": ["React"], "ai_ml_usage": null, "frameworks": ["Django"],
+                   "platform_details": "SaaS"},
+    "marketing_strategy": {"campaigns": [], "channels": ["Search"], "positioning": "Team productivity",
+                           "engagement_metrics": null}
+}"""
+
+# Words mixed into snippets so that results of different companies differ
+_SNIPPET_WORDS = (
+    "agile boards sprints roadmaps invoicing budgets timelines gantt kanban wikis chat "
+    "automation dashboards reporting forms approvals portfolios goals okrs templates "
+    "integrations security compliance sso audit mobile offline api webhooks analytics"
+).split()
+
+_EMBEDDING_SIZE = 256
+
+class FakeServices:
+    def __init__(self, config: FakeServiceConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.counts = {"google": 0, "llm": 0, "embeddings": 0, "site": 0, "errors": 0}
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> None:
+        """Start serving on a background thread and wait until it is listening"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self._loop).result()
+
+    def stop(self) -> None:
+        if self._runner:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _serve(self) -> None:
+        app = web.Application()
+        app.router.add_get("/customsearch/v1", self._google)
+        app.router.add_post("/v1/chat/completions", self._chat_completion)
+        app.router.add_post("/v1/embeddings", self._embeddings)
+        app.router.add_get("/site/{name}", self._site)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def _fail(self, rate: float) -> bool:
+        if rate and random.random() < rate:
+            self.counts["errors"] += 1
+            return True
+        return False
+
+    async def _google(self, request: web.Request) -> web.Response:
+        self.counts["google"] += 1
+        await asyncio.sleep(self.config.google_latency)
+        if self._fail(self.config.google_error_rate):
+            return web.json_response({"error": "backend error"}, status=500)
+
+        query = request.query.get("q", "")
+        num = int(request.query.get("num", "10"))
+        seed = zlib.crc32(query.encode()) % 1000
+        rng = random.Random(seed)
+        items = []
+        for i in range(num):
+            if items and rng.random() < self.config.google_duplicate_rate:
+                # The same page again under a tracking link
+                items.append({**items[-1], "link": items[-1]["link"] + f"?utm_source=result-{i}"})
+                continue
+            company = (seed + i) % 50
+            items.append({
+                "title": f"{query} result {i}",
+                "link": f"{self.base_url}/site/company-{company}",
+                "snippet": f"Company {company} offers tools related to {query}: "
+                           + ", ".join(random.Random(company).sample(_SNIPPET_WORDS, 8)) + "."
+            })
+        return web.json_response({"items": items})
+
+    async def _embeddings(self, request: web.Request) -> web.Response:
+        """Texts sharing words get similar vectors, which is enough to exercise similarity search"""
+        self.counts["embeddings"] += 1
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for index, text in enumerate(texts):
+            vector = [0.0] * _EMBEDDING_SIZE
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                vector[zlib.crc32(word.encode()) % _EMBEDDING_SIZE] += 1.0
+            norm = sum(x * x for x in vector) ** 0.5 or 1.0
+            data.append({"object": "embedding", "index": index, "embedding": [x / norm for x in vector]})
+        tokens = sum(len(text.split()) for text in texts)
+        return web.json_response({
+            "object": "list", "data": data, "model": body.get("model", ""),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    async def _chat_completion(self, request: web.Request) -> web.Response:
+        self.counts["llm"] += 1
+        body = await request.json()
+        jitter = random.uniform(-self.config.llm_jitter, self.config.llm_jitter)
+        latency = max(0.0, self.config.llm_latency + jitter)
+        if self.config.llm_tail_rate and random.random() < self.config.llm_tail_rate:
+            latency = self.config.llm_latency * self.config.llm_tail_multiplier
+        await asyncio.sleep(latency)
+        if self._fail(self.config.llm_error_rate):
+            return web.json_response({"error": {"message": "server error", "type": "server_error"}}, status=500)
+
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        prompt_tokens = len(prompt) // 4
+
+        # Echo the analysed website back so each competitor gets its own profile
+        content = json.loads(_LLM_CONTENT)
+        url = re.search(r"URL: (\S+)", prompt)
+        if url:
+            content["company_info"]["website"] = url.group(1)
+            content["company_info"]["name"] = url.group(1).rstrip("/").rsplit("/", 1)[-1]
+        return web.json_response({
+            "id": f"chatcmpl-{self.counts['llm']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": 250,
+                "total_tokens": prompt_tokens + 250
+            }
+        })
+
+    async def _site(self, request: web.Request) -> web.Response:
+        self.counts["site"] += 1
+        await asyncio.sleep(self.config.site_latency)
+        name = request.match_info["name"]
+        html = (
+            f"<html><head><title>{name} - Team productivity software</title>"
+            f'<meta name="description" content="{name} helps teams plan, track and ship work.">'
+            f"</head><body><h1>{name}</h1></body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
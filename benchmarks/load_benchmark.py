@@ -0,0 +1,264 @@
+"""
+End-to-end load test for /search against local fake upstreams.
+
+Starts the fake Google / OpenAI / competitor-site services, points
+DataCollector at them through its environment variables, serves main:app
+with uvicorn in-process and drives /search at the requested concurrency.
+The same request mix is sent twice: a cold pass against an empty cache and
+a warm pass that is served from the cache.
+
+With --workers N the app runs as N uvicorn worker processes instead, sharing
+a Chroma server started for the test (see scraper/coordination.py).
+
+Usage:
+    python -m benchmarks.load_benchmark --requests 200 --concurrency 20
+    python -m benchmarks.load_benchmark --llm-latency 1.0 --llm-error-rate 0.02 --json results.json
+    python -m benchmarks.load_benchmark --workers 4 --requests 400 --concurrency 40
+    LLM_HEDGE_ENABLED=1 python -m benchmarks.load_benchmark --llm-tail-rate 0.05 --llm-tail-multiplier 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import aiohttp
+from .fake_services import FakeServiceConfig, FakeServices
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def build_requests(args: argparse.Namespace, sites_url: str) -> List[Dict]:
+    """A reproducible mix of queries, each with a few competitor sites"""
+    rng = random.Random(args.seed)
+    queries = [f"benchmark query {i}" for i in range(args.queries)]
+    requests = []
+    for i in range(args.requests):
+        competitors = [
+            f"{sites_url}/site/company-{rng.randrange(args.competitor_pool)}"
+            for _ in range(args.competitors_per_request)
+        ]
+        requests.append({
+            "query": queries[i % len(queries)],
+            "num_results": args.num_results,
+            "competitors": competitors
+        })
+    return requests
+
+async def run_pass(base_url: str, payloads: List[Dict], concurrency: int) -> Dict:
+    """Send all payloads to /search with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    accepted_latencies = []
+    statuses: Dict[str, int] = {}
+    timeout = aiohttp.ClientTimeout(total=None)
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async def send(payload: Dict) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    async with session.post(f"{base_url}/search", json=payload) as response:
+                        await response.read()
+                        status = str(response.status)
+                except aiohttp.ClientError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                if status == "200":
+                    accepted_latencies.append(latencies[-1])
+                statuses[status] = statuses.get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(payload) for payload in payloads))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(payloads) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies, default=0.0) * 1000, 1)
+        },
+        # Successful requests only, without the quick 429s of shed load
+        "accepted_latency_ms": {
+            "p50": round(percentile(accepted_latencies, 50) * 1000, 1),
+            "p95": round(percentile(accepted_latencies, 95) * 1000, 1),
+            "p99": round(percentile(accepted_latencies, 99) * 1000, 1)
+        },
+        "statuses": statuses
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _wait_for(url: str, timeout: float = 120) -> None:
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"{url} did not become ready within {timeout}s")
+
+async def start_worker_processes(workers: int, workdir: str, repo_root: str) -> Tuple[str, List[subprocess.Popen]]:
+    """Start a Chroma server and `workers` uvicorn workers connected to it"""
+    chroma_port, app_port = _free_port(), _free_port()
+    chroma = subprocess.Popen(
+        [os.path.join(os.path.dirname(sys.executable), "chroma"), "run",
+         "--path", os.path.join(workdir, "data"), "--port", str(chroma_port)],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    processes = [chroma]
+    await _wait_for(f"http://127.0.0.1:{chroma_port}/api/v2/heartbeat")
+
+    env = {
+        **os.environ,
+        "PYTHONPATH": repo_root,
+        "CHROMA_SERVER_HOST": "127.0.0.1",
+        "CHROMA_SERVER_PORT": str(chroma_port)
+    }
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env
+    ))
+    base_url = f"http://127.0.0.1:{app_port}"
+    await _wait_for(f"{base_url}/ready")
+    return base_url, processes
+
+def print_report(report: Dict) -> None:
+    print(f"\nUpstream config: {report['config']}, workers: {report['workers']}")
+    for name in ("cold", "warm"):
+        result = report[name]
+        latency = result["latency_ms"]
+        print(
+            f"{name:>5}: {result['requests']} requests @ {result['concurrency']} concurrent in "
+            f"{result['elapsed_s']}s -> {result['throughput_rps']} req/s | "
+            f"p50 {latency['p50']}ms p95 {latency['p95']}ms p99 {latency['p99']}ms max {latency['max']}ms | "
+            f"accepted p95 {result['accepted_latency_ms']['p95']}ms | "
+            f"statuses {result['statuses']}"
+        )
+    print(f"Upstream calls: {report['upstream_calls']}")
+
+async def main(args: argparse.Namespace) -> Dict:
+    config = FakeServiceConfig(
+        llm_latency=args.llm_latency,
+        llm_jitter=args.llm_jitter,
+        llm_error_rate=args.llm_error_rate,
+        llm_tail_rate=args.llm_tail_rate,
+        llm_tail_multiplier=args.llm_tail_multiplier,
+        google_latency=args.google_latency,
+        google_error_rate=args.google_error_rate,
+        google_duplicate_rate=args.google_duplicate_rate,
+        site_latency=args.site_latency
+    )
+    fakes = FakeServices(config)
+    fakes.start()
+
+    # DataCollector reads these when main.py creates it
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{fakes.base_url}/v1",
+        "GOOGLE_API_KEY": "benchmark",
+        "GOOGLE_SEARCH_ID": "benchmark",
+        "GOOGLE_CUSTOM_SEARCH_URL": f"{fakes.base_url}/customsearch/v1"
+    })
+
+    # DBManager stores its cache in ./data; keep the benchmark's cache isolated
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo_root)
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    os.chdir(workdir)
+
+    server, server_task, processes = None, None, []
+    try:
+        if args.workers > 1:
+            base_url, processes = await start_worker_processes(args.workers, workdir, repo_root)
+        else:
+            import uvicorn
+            server = uvicorn.Server(uvicorn.Config("main:app", host="127.0.0.1", port=args.port, log_level="warning"))
+            server_task = asyncio.create_task(server.serve())
+            while not server.started:
+                if server_task.done():
+                    server_task.result()
+                await asyncio.sleep(0.05)
+            port = server.servers[0].sockets[0].getsockname()[1]
+            base_url = f"http://127.0.0.1:{port}"
+
+        payloads = build_requests(args, fakes.base_url)
+        cold = await run_pass(base_url, payloads, args.concurrency)
+        warm = await run_pass(base_url, payloads, args.concurrency)
+    finally:
+        if server:
+            server.should_exit = True
+            await server_task
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        fakes.stop()
+
+    return {
+        "config": config.model_dump(),
+        "workers": args.workers,
+        "cache_dir": workdir,
+        "cold": cold,
+        "warm": warm,
+        "upstream_calls": fakes.counts
+    }
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test /search against local fake upstreams")
+    parser.add_argument("--requests", type=int, default=100, help="requests per pass")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=20, help="distinct queries in the mix")
+    parser.add_argument("--num-results", type=int, default=5)
+    parser.add_argument("--competitors-per-request", type=int, default=2)
+    parser.add_argument("--competitor-pool", type=int, default=30)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-tail-rate", type=float, default=0.0,
+                        help="fraction of LLM calls that are slow")
+    parser.add_argument("--llm-tail-multiplier", type=float, default=4.0,
+                        help="latency of slow LLM calls as a multiple of --llm-latency")
+    parser.add_argument("--google-latency", type=float, default=0.1)
+    parser.add_argument("--google-error-rate", type=float, default=0.0)
+    parser.add_argument("--google-duplicate-rate", type=float, default=0.0,
+                        help="fraction of search results that duplicate the previous one")
+    parser.add_argument("--site-latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=0, help="port for the app under test (0 picks a free one)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="run the app as this many worker processes sharing a Chroma server")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    # main() changes into a scratch directory, so resolve the output path first
+    output_path = os.path.abspath(args.json) if args.json else None
+    report = asyncio.run(main(args))
+    print_report(report)
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,108 @@
+"""
+Worker startup profile.
+
+Starts `uvicorn main:app` in a fresh process and measures how long it takes
+until /health answers (time to first request) and until /ready reports the
+worker ready to serve /search. Also prints the slowest imports of `main`
+from `python -X importtime`.
+
+Usage:
+    python -m benchmarks.startup_profile
+    python -m benchmarks.startup_profile --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# DataCollector refuses to start without these; nothing is called upstream
+DUMMY_ENV = {
+    "OPENAI_API_KEY": "startup-profile",
+    "GOOGLE_API_KEY": "startup-profile",
+    "GOOGLE_SEARCH_ID": "startup-profile",
+    "GOOGLE_CUSTOM_SEARCH_URL": "http://127.0.0.1:9/customsearch/v1"
+}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _status(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+def measure_startup(timeout: float) -> Dict[str, Optional[float]]:
+    """Seconds from process start until /health and /ready first return 200"""
+    port = _free_port()
+    env = {**os.environ, **DUMMY_ENV, "PYTHONPATH": REPO_ROOT}
+    workdir = tempfile.mkdtemp(prefix="startup-profile-")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    timings = {"health_s": None, "ready_s": None}
+    try:
+        while time.perf_counter() - start < timeout and timings["ready_s"] is None:
+            if timings["health_s"] is None and _status(f"http://127.0.0.1:{port}/health") == 200:
+                timings["health_s"] = round(time.perf_counter() - start, 3)
+            if timings["health_s"] is not None:
+                ready = _status(f"http://127.0.0.1:{port}/ready")
+                # Before the readiness endpoint existed, a healthy worker was a ready one
+                if ready == 200 or ready == 404:
+                    timings["ready_s"] = round(time.perf_counter() - start, 3)
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+    return timings
+
+def slowest_imports(top: int, max_depth: int = 2) -> List[Tuple[int, str]]:
+    """
+    Cumulative import time in microseconds of the slowest modules imported by
+    main, down to `max_depth` levels of nested imports
+    """
+    env = {**os.environ, **DUMMY_ENV, "PYTHONPATH": REPO_ROOT}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=tempfile.mkdtemp(prefix="startup-profile-"), env=env, capture_output=True, text=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match and (len(match.group(2)) - 1) // 2 <= max_depth:
+            entries.append((int(match.group(1)), match.group(3)))
+    return sorted(entries, reverse=True)[:top]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile uvicorn worker startup")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    runs = [measure_startup(args.timeout) for _ in range(args.runs)]
+    for i, timings in enumerate(runs, 1):
+        print(f"run {i}: /health after {timings['health_s']}s, ready after {timings['ready_s']}s")
+
+    print(f"\nSlowest imports of main (cumulative):")
+    for microseconds, module in slowest_imports(args.top):
+        print(f"  {microseconds / 1e6:7.3f}s  {module}")
+
+if __name__ == "__main__":
+    main()
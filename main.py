@@ -1,13 +1,88 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from models.request import AnalysisRequest
-from models.response import SearchResponse
-from scraper.data_collector import DataCollector
+from models.response import SearchResponse, SimilarCompetitorsResponse
+from scraper.admission import AdmissionController, AdmissionRejected
+from scraper.telemetry import render_metrics
+import asyncio
+import os
+from typing import Optional
 import uvicorn
 
+# The data collector (Chroma client, OpenAI client) is built in a worker
+# thread after startup, so /health answers while it initializes.
+_collector_task = None
+_backfill_task = None
+prewarmer = None
+
+# Seconds clients are asked to wait before retrying while the collector initializes
+STARTUP_RETRY_AFTER_SECONDS = int(os.getenv("STARTUP_RETRY_AFTER_SECONDS", "5"))
+
+# Bound the requests running and waiting in this worker. Requests with all
+# their data cached get a separate, wider lane.
+admission = AdmissionController.from_env("analysis", "SEARCH", 8, 16, 10)
+cached_admission = AdmissionController.from_env("cached", "SEARCH_CACHED", 32, 64, 5)
+
+def _create_collector():
+    # Imported here so that importing main stays cheap
+    from scraper.data_collector import DataCollector
+    return DataCollector()
+
+async def _initialize():
+    global prewarmer, _backfill_task
+    collector = await asyncio.to_thread(_create_collector)
+    # One worker embeds profiles that were stored before they were indexed
+    if collector.coordinator.leader("competitor_index"):
+        _backfill_task = asyncio.create_task(collector.backfill_competitor_index())
+    if os.getenv("CACHE_PREWARM_ENABLED") == "1":
+        from scraper.prewarm import CachePrewarmer
+        prewarmer = CachePrewarmer.from_env(collector)
+        prewarmer.start()
+    return collector
+
+def get_collector():
+    """
+    The data collector. Requests aren't held while it initializes: they get
+    a 503 with Retry-After, or a plain 503 if initializing it failed.
+    """
+    if _collector_task is None:
+        # Lifespan startup hasn't run, so initialization was never started
+        raise HTTPException(status_code=503, detail="Service is not initialized")
+    if not _collector_task.done():
+        raise HTTPException(
+            status_code=503,
+            detail="Service is starting",
+            headers={"Retry-After": str(STARTUP_RETRY_AFTER_SECONDS)}
+        )
+    if _collector_task.exception():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service failed to initialize: {str(_collector_task.exception())}"
+        )
+    return _collector_task.result()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _collector_task
+    _collector_task = asyncio.create_task(_initialize())
+    yield
+    if _backfill_task:
+        _backfill_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _backfill_task
+    if prewarmer:
+        await prewarmer.stop()
+    elif _collector_task.done() and not _collector_task.exception():
+        await _collector_task.result().db_manager.flush_access_stats()
+
 app = FastAPI(
     title="Google Search Analyzer",
-    description="Web scraping system for collecting and analyzing Google Search results"
+    description="Web scraping system for collecting and analyzing Google Search results",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -17,28 +92,124 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "Retry-After"],
 )
 
-# Initialize the data collector
-collector = DataCollector()
+# Trace every request; spans from the collector nest under the request span
+FastAPIInstrumentor.instrument_app(app, excluded_urls="health,ready,metrics")
+
+def _authorize_profiling(token: str) -> None:
+    # Imported here so that requests without the header never load the profiler
+    from scraper.profiling import authorized
+    if not authorized(token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
 
 @app.post("/search", response_model=SearchResponse)
-async def search_and_analyze(request: AnalysisRequest):
+async def search_and_analyze(request: AnalysisRequest, x_profile: Optional[str] = Header(None)):
     """
-    Search Google and analyze results using OpenAI
+    Search Google and analyze results using OpenAI. With a valid X-Profile
+    header the request is profiled; the X-Profile-Id response header names
+    the profile to fetch from /profiles/{id}.
     """
+    if x_profile is not None:
+        _authorize_profiling(x_profile)
+    collector = get_collector()
     try:
-        results = await collector.collect_data(request)
-        return results
+        # Requests with everything cached need no searches or profiling,
+        # so they don't wait behind full analyses
+        lane = cached_admission if await collector.can_serve_from_cache(request) else admission
+        async with lane.slot():
+            return await _collect(collector, request, x_profile)
+    except AdmissionRejected as e:
+        return ORJSONResponse(
+            {"detail": str(e)},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _collect(collector, request: AnalysisRequest, x_profile: Optional[str]) -> Response:
+    # The collector returns the response already serialized, so skip
+    # FastAPI's response_model validation and re-encoding
+    if x_profile is None:
+        content = await collector.collect_data_json(request)
+        return Response(content=content, media_type="application/json")
+
+    from scraper.profiling import profile_request
+    async with profile_request(f"/search {request.query}") as profile:
+        content = await collector.collect_data_json(request)
+    return Response(content=content, media_type="application/json", headers={"X-Profile-Id": profile.id})
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|collapsed)$"),
+                      x_profile: Optional[str] = Header(None)):
+    """
+    A saved request profile: stage breakdown, spans and sampled stacks as
+    JSON, or the stacks alone in the collapsed format (format=collapsed)
+    for flamegraph.pl or speedscope
+    """
+    _authorize_profiling(x_profile or "")
+    from scraper.profiling import collapsed_stacks, load_profile
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id}")
+    if format == "collapsed":
+        return PlainTextResponse(
+            collapsed_stacks(profile),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'}
+        )
+    return ORJSONResponse(
+        profile,
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.json"'}
+    )
+
+@app.get("/competitors/similar", response_model=SimilarCompetitorsResponse)
+async def similar_competitors(
+    to: str,
+    k: int = Query(10, gt=0, le=100),
+    industry: Optional[str] = None
+):
+    """
+    Find cached competitors similar to a competitor, optionally in one industry
+    """
+    collector = get_collector()
+    try:
+        response = await collector.find_similar_competitors(to, k, industry)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"No profile found for {to}")
+    return response
+
 @app.get("/health")
 async def health_check():
     """
-    Health check endpoint
+    Liveness check: the worker is up and serving requests
     """
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness check: the data collector is initialized and /search can be served
+    """
+    if _collector_task is None or not _collector_task.done():
+        return ORJSONResponse({"status": "starting"}, status_code=503)
+    if _collector_task.exception():
+        return ORJSONResponse(
+            {"status": "failed", "detail": str(_collector_task.exception())},
+            status_code=503
+        )
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Latency histograms, cache hit/miss counters and in-flight gauges in the
+    Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
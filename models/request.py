@@ -1,10 +1,13 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 class AnalysisRequest(BaseModel):
     query: str
     num_results: Optional[int] = 10
     competitors: Optional[List[str]] = None
+    # Time budget for the whole request; when it runs out the stages that
+    # finished are returned and the rest are listed in data_source_info
+    latency_budget_ms: Optional[int] = Field(None, gt=0)
     
     class Config:
         json_schema_extra = {
@@ -14,6 +17,7 @@ class AnalysisRequest(BaseModel):
                 "competitors": [
                     "asana.com",
                     "monday.com"
-                ]
+                ],
+                "latency_budget_ms": 20000
             }
         }
\ No newline at end of file
@@ -27,11 +27,44 @@ class DataSourceInfo(BaseModel):
     search_results_from_cache: bool = False
     competitors_from_cache: List[str] = []
     fresh_competitors: List[str] = []
+    # Fresh competitors of which only the stale profile sections were regenerated
+    refreshed_sections: Dict[str, List[str]] = {}
     last_cache_update: Optional[datetime] = None
+    # Set when the request's latency budget ran out. Skipped work was never
+    # started; pending work was still in progress at the deadline.
+    deadline_exceeded: bool = False
+    skipped_competitors: List[str] = []
+    pending_competitors: List[str] = []
+    skipped_sections: List[str] = []
+    pending_sections: List[str] = []
+
+class TokenUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    total_tokens: int = 0
+
+class Diagnostics(BaseModel):
+    token_usage: Dict[str, TokenUsage] = {}  # keyed by LLM stage
+    total_usage: TokenUsage = TokenUsage()
+    tokens_saved_by_cache: int = 0
 
 class SearchResponse(BaseModel):
     query: str
     results: List[SearchResult]
     swot_analysis: SwotAnalysis
     comparison: Optional[ComparisonResult]
-    data_source_info: DataSourceInfo
\ No newline at end of file
+    data_source_info: DataSourceInfo
+    diagnostics: Optional[Diagnostics] = None
+
+class SimilarCompetitor(BaseModel):
+    name: str
+    website: str
+    industry: str
+    similarity: float  # cosine similarity of the profile summaries
+
+class SimilarCompetitorsResponse(BaseModel):
+    to: str
+    industry: Optional[str] = None
+    competitors: List[SimilarCompetitor]
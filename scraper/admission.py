@@ -0,0 +1,133 @@
+"""
+Admission control for /search.
+
+Requests are admitted through one of two lanes, each with its own limit
+on requests running at once in a worker process and a bounded,
+first-come-first-served queue with a maximum wait. Requests beyond that are
+rejected right away with an estimate of when to retry, so that under a
+burst the requests that are accepted keep a predictable latency instead of
+all of them slowing down and timing out together.
+
+main.py sends requests whose data is all cached through the "cached" lane,
+so they don't wait behind full analyses. They still make the SWOT and
+comparison LLM calls, so that lane is wider but bounded too.
+
+Configured through environment variables (defaults for the analysis lane,
+then the cached lane):
+    SEARCH_MAX_CONCURRENT, SEARCH_CACHED_MAX_CONCURRENT
+        requests running at once per worker (8, 32)
+    SEARCH_MAX_QUEUED, SEARCH_CACHED_MAX_QUEUED
+        requests waiting for a slot per worker (16, 64)
+    SEARCH_QUEUE_TIMEOUT_SECONDS, SEARCH_CACHED_QUEUE_TIMEOUT_SECONDS
+        longest wait for a slot (10, 5)
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Optional
+from .telemetry import meter
+
+_admitted = meter.create_counter(
+    "admission.admitted",
+    description="/search requests given a slot, by lane"
+)
+_rejected = meter.create_counter(
+    "admission.rejected",
+    description="/search requests rejected with 429, by lane and reason (queue_full, queue_timeout)"
+)
+_queued = meter.create_up_down_counter(
+    "admission.queued",
+    description="/search requests waiting for a slot, by lane"
+)
+
+class AdmissionRejected(Exception):
+    """No slot could be given to the request; retry after `retry_after` seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Too many concurrent requests ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    def __init__(self, lane: str, max_concurrent: int = 8, max_queued: int = 16, queue_timeout: float = 10.0):
+        self.lane = lane
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long a request holds its slot
+        self._average_duration: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, lane: str, prefix: str, max_concurrent: int, max_queued: int,
+                 queue_timeout: float) -> "AdmissionController":
+        return cls(
+            lane,
+            max_concurrent=int(os.getenv(f"{prefix}_MAX_CONCURRENT", str(max_concurrent))),
+            max_queued=int(os.getenv(f"{prefix}_MAX_QUEUED", str(max_queued))),
+            queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_SECONDS", str(queue_timeout)))
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained enough to admit another request"""
+        duration = self._average_duration or 1.0
+        return max(1, math.ceil(duration * (len(self._waiters) + 1) / self.max_concurrent))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        _rejected.add(1, {"lane": self.lane, "reason": reason})
+        return AdmissionRejected(reason, self.retry_after())
+
+    async def _acquire(self) -> None:
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            _admitted.add(1, {"lane": self.lane})
+            return
+        if len(self._waiters) >= self.max_queued:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        _queued.add(1, {"lane": self.lane})
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            # Cancelled while waiting; pass on a slot that was just handed over
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            _queued.add(-1, {"lane": self.lane})
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        if not waiter.done():
+            waiter.cancel()
+            raise self._reject("queue_timeout")
+        _admitted.add(1, {"lane": self.lane})
+
+    def _release(self) -> None:
+        # Hand the slot straight to the next waiter, if any
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the lane's slots, raising AdmissionRejected if none is available in time"""
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self._average_duration = duration if self._average_duration is None else \
+                0.8 * self._average_duration + 0.2 * duration
+            self._release()
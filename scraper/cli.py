@@ -0,0 +1,64 @@
+"""
+Maintenance commands for the local cache.
+
+Usage:
+    python -m scraper.cli import-companies competitors.json
+    python -m scraper.cli cache-stats
+"""
+import argparse
+import asyncio
+import json
+from .db_manager import DBManager
+
+async def import_companies(path: str) -> None:
+    """
+    Preload the company name -> website index from a JSON file containing a
+    list of {"name": ..., "website": ..., "aliases": [...]} objects.
+    """
+    with open(path) as f:
+        companies = json.load(f)
+
+    db_manager = DBManager()
+    if await db_manager.import_company_urls(companies):
+        print(f"Imported {len(companies)} companies")
+    else:
+        print("No companies imported")
+
+async def cache_stats() -> None:
+    """Print document counts and the bytes saved by compression"""
+    db_manager = DBManager()
+    stats = await db_manager.get_storage_stats()
+    for name, collection_stats in stats.items():
+        raw = collection_stats["raw_bytes"]
+        saved = collection_stats["bytes_saved"]
+        ratio = f"{saved / raw:.1%}" if raw else "n/a"
+        print(
+            f"{name}: {collection_stats['documents']} documents "
+            f"({collection_stats['legacy_documents']} legacy), "
+            f"{collection_stats['stored_bytes']} bytes stored, "
+            f"{raw} bytes uncompressed, {saved} bytes saved ({ratio})"
+        )
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import-companies",
+        help="Bulk import known company websites into the resolution index"
+    )
+    import_parser.add_argument("path", help="JSON file with a list of companies")
+
+    subparsers.add_parser(
+        "cache-stats",
+        help="Report cache size and bytes saved by compression"
+    )
+
+    args = parser.parse_args()
+    if args.command == "import-companies":
+        asyncio.run(import_companies(args.path))
+    elif args.command == "cache-stats":
+        asyncio.run(cache_stats())
+
+if __name__ == "__main__":
+    main()
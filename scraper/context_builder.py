@@ -0,0 +1,166 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+from models.response import SearchResult
+from models.competitor import CompetitorProfile
+
+# Fields rendered for each search result, as (label, attribute)
+SWOT_RESULT_FIELDS = [("Title", "title"), ("Snippet", "snippet"), ("Analysis", "analysis")]
+COMPARISON_RESULT_FIELDS = [("Title", "title"), ("Analysis", "analysis")]
+
+# Fields rendered for each competitor profile, as (label, dotted attribute path)
+SWOT_PROFILE_FIELDS = [
+    ("Industry", "company_info.industry"),
+    ("Target Market", "market_position.target_audience"),
+    ("Key Features", "product_service.features"),
+    ("Value Propositions", "market_position.value_propositions"),
+]
+COMPARISON_PROFILE_FIELDS = [
+    ("Features", "product_service.features"),
+    ("Target Market", "market_position.target_audience"),
+    ("Differentiators", "product_service.differentiators"),
+]
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+class ContextBuilder:
+    """
+    Builds the data section of the SWOT and comparison prompts while keeping
+    it within a token budget. Competitor profiles are compacted and added
+    first, then search results are ranked, de-duplicated and added until the
+    budget is used up. Profiles may not use the share of the budget reserved
+    for results (`result_share`), or as much of it as the results need.
+    """
+
+    def __init__(self, max_tokens: int = 3000, max_list_items: int = 5, max_field_chars: int = 300,
+                 result_share: float = 0.4):
+        self.max_tokens = max_tokens
+        self.max_list_items = max_list_items
+        self.max_field_chars = max_field_chars
+        self.result_share = result_share
+
+    def build(
+        self,
+        results: List[SearchResult],
+        competitor_profiles: List[CompetitorProfile],
+        result_fields: Sequence[Tuple[str, str]],
+        profile_fields: Sequence[Tuple[str, str]],
+        query: Optional[str] = None
+    ) -> Tuple[str, Dict]:
+        """Return the prompt content and a report of what was trimmed"""
+        stats = {
+            "budget_tokens": self.max_tokens,
+            "estimated_tokens": 0,
+            "results_included": 0,
+            "results_dropped": 0,
+            "duplicates_removed": 0,
+            "profiles_included": 0,
+            "profiles_dropped": 0,
+            "chars_trimmed": 0,
+        }
+
+        header = f"Query: {query}\n\n" if query else ""
+        used = estimate_tokens(header + "Search Results:\n" + ("\nCompetitor Profiles:\n" if competitor_profiles else ""))
+
+        # Ranked, de-duplicated results as (block, chars trimmed from it)
+        candidates = []
+        seen = set()
+        for result in self._rank_results(results, query):
+            key = _normalize_text(result.snippet or result.title)
+            if key in seen:
+                stats["duplicates_removed"] += 1
+                continue
+            seen.add(key)
+            trimmed = {"chars_trimmed": 0}
+            candidates.append((self._format_result(result, result_fields, trimmed), trimmed["chars_trimmed"]))
+        reserved = min(
+            int(self.max_tokens * self.result_share),
+            sum(estimate_tokens(block) for block, _ in candidates)
+        )
+
+        profile_blocks = []
+        for profile in competitor_profiles:
+            trimmed_before = stats["chars_trimmed"]
+            block = self._format_profile(profile, profile_fields, stats)
+            cost = estimate_tokens(block)
+            if used + cost > self.max_tokens - reserved:
+                stats["chars_trimmed"] = trimmed_before
+                stats["profiles_dropped"] += 1
+                continue
+            profile_blocks.append(block)
+            used += cost
+            stats["profiles_included"] += 1
+
+        result_blocks = []
+        for block, trimmed in candidates:
+            cost = estimate_tokens(block)
+            if used + cost > self.max_tokens:
+                stats["results_dropped"] += 1
+                continue
+            result_blocks.append(block)
+            used += cost
+            stats["results_included"] += 1
+            stats["chars_trimmed"] += trimmed
+
+        parts = [header, "Search Results:\n", *result_blocks]
+        if profile_blocks:
+            parts += ["\nCompetitor Profiles:\n", *profile_blocks]
+        content = "".join(parts)
+
+        stats["estimated_tokens"] = estimate_tokens(content)
+        return content, stats
+
+    def _rank_results(self, results: List[SearchResult], query: Optional[str]) -> List[SearchResult]:
+        """
+        Order results by how many query terms they mention, keeping Google's
+        ranking as the tie-breaker.
+        """
+        if not query:
+            return list(results)
+
+        terms = set(re.findall(r"\w+", query.lower()))
+
+        def overlap(result: SearchResult) -> int:
+            words = set(re.findall(r"\w+", f"{result.title} {result.snippet}".lower()))
+            return len(terms & words)
+
+        ranked = sorted(enumerate(results), key=lambda item: (-overlap(item[1]), item[0]))
+        return [result for _, result in ranked]
+
+    def _format_result(self, result: SearchResult, fields: Sequence[Tuple[str, str]], stats: Dict) -> str:
+        lines = []
+        seen_values = set()
+        for label, attribute in fields:
+            value = self._trim(str(getattr(result, attribute, "") or ""), stats)
+            normalized = _normalize_text(value)
+            # Skip fields that only repeat an earlier one (e.g. analysis == snippet)
+            if not normalized or normalized in seen_values:
+                continue
+            seen_values.add(normalized)
+            lines.append(f"{label}: {value}")
+        return "\n" + "\n".join(lines) + "\n"
+
+    def _format_profile(self, profile: CompetitorProfile, fields: Sequence[Tuple[str, str]], stats: Dict) -> str:
+        lines = [f"Competitor: {profile.company_info.name}"]
+        for label, path in fields:
+            value = profile
+            for attribute in path.split("."):
+                value = getattr(value, attribute, None)
+            if isinstance(value, list):
+                stats["chars_trimmed"] += sum(len(str(v)) for v in value[self.max_list_items:])
+                value = ", ".join(str(v) for v in value[:self.max_list_items])
+            value = self._trim(str(value or ""), stats)
+            if value:
+                lines.append(f"{label}: {value}")
+        return "\n" + "\n".join(lines) + "\n"
+
+    def _trim(self, text: str, stats: Dict) -> str:
+        text = re.sub(r"\s+", " ", text).strip()
+        if len(text) <= self.max_field_chars:
+            return text
+        stats["chars_trimmed"] += len(text) - self.max_field_chars
+        return text[:self.max_field_chars].rstrip() + "..."
@@ -0,0 +1,208 @@
+"""
+Coordination between uvicorn/gunicorn worker processes on one host.
+
+To run several workers, start a shared Chroma server and point every worker
+at it (an embedded PersistentClient must not be opened by more than one
+process):
+
+    chroma run --path ./data --port 8001
+    CHROMA_SERVER_HOST=127.0.0.1 CHROMA_SERVER_PORT=8001 uvicorn main:app --workers 4
+
+The workers then share the cache, but each would still regenerate a missing
+entry and call Google/OpenAI at its own pace. WorkerCoordinator adds:
+
+    single_flight(key)   only one worker (and one request within it)
+                         regenerates a missing cache entry; the others wait
+                         and then read the entry from the cache
+    leader(name)         non-blocking lock for work only one worker should
+                         do, e.g. the cache prewarmer
+    rate_limiters        request rates shared by all workers, per upstream
+
+State is kept in lock files under COORDINATION_DIR, so all workers must
+share that directory (they do by default, as they share a working
+directory). Configured through environment variables:
+
+    COORDINATION_DIR               lock and rate-limit state (default ./data/coordination)
+    SINGLE_FLIGHT_TIMEOUT_SECONDS  how long to wait for another worker's refresh
+                                   before doing it anyway (default 120)
+    GOOGLE_RATE_LIMIT              Google searches per second across workers (default unlimited)
+    GOOGLE_RATE_BURST              searches allowed back to back (default 1)
+    OPENAI_RATE_LIMIT              chat completions per second across workers (default unlimited)
+    OPENAI_RATE_BURST              completions allowed back to back (default 1)
+"""
+import asyncio
+import hashlib
+import os
+import struct
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from filelock import FileLock, Timeout
+from .telemetry import meter
+
+# Single-flight keys are unbounded, so they share a fixed set of lock files
+_LOCK_STRIPES = 256
+_POLL_INTERVAL_SECONDS = 0.05
+
+_single_flight_waits = meter.create_counter(
+    "coordination.single_flight_waits",
+    description="Cache refreshes that waited for another request or worker, by outcome"
+)
+_rate_limited = meter.create_counter(
+    "coordination.rate_limited",
+    description="Upstream calls delayed by the shared rate limit, by upstream"
+)
+_rate_limit_delay = meter.create_counter(
+    "coordination.rate_limit_delay",
+    unit="s",
+    description="Total time upstream calls were delayed by the shared rate limit, by upstream"
+)
+
+class RateLimiter:
+    """
+    A rate limit shared by all processes using the same state file. Each
+    call reserves the next free slot (a generic cell rate algorithm), so
+    waiting callers are served in order and never retry. Reservations read
+    and write the state file under a file lock, so they run in a thread
+    rather than on the event loop.
+    """
+
+    def __init__(self, name: str, directory: str, rate: float, burst: int = 1):
+        self.name = name
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self.path = os.path.join(directory, f"ratelimit-{name}")
+        self._lock = FileLock(self.path + ".lock", thread_local=False)
+        # The file lock is reentrant, so it doesn't exclude threads of this process
+        self._thread_lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Reserve a slot and return how many seconds until it starts"""
+        with self._thread_lock, self._lock:
+            now = time.time()
+            try:
+                with open(self.path, "rb") as f:
+                    (next_free,) = struct.unpack("d", f.read(8))
+            except (OSError, struct.error):
+                next_free = now
+            next_free = max(next_free, now) + self.interval
+            with open(self.path, "wb") as f:
+                f.write(struct.pack("d", next_free))
+        return max(0.0, next_free - now - self.burst * self.interval)
+
+    async def acquire(self) -> None:
+        delay = await asyncio.to_thread(self._reserve)
+        if delay > 0:
+            _rate_limited.add(1, {"upstream": self.name})
+            _rate_limit_delay.add(delay, {"upstream": self.name})
+            await asyncio.sleep(delay)
+
+class WorkerCoordinator:
+    def __init__(self, directory: str, single_flight_timeout: float = 120,
+                 rate_limits: Optional[Dict[str, tuple]] = None):
+        self.directory = directory
+        self.single_flight_timeout = single_flight_timeout
+        os.makedirs(directory, exist_ok=True)
+
+        # Requests in this process wait on an asyncio lock first, so only one
+        # of them at a time polls the file lock shared with other workers
+        self._local_locks: Dict[str, list] = {}
+        self._stripe_locks: Dict[int, FileLock] = {}
+        self._leader_locks: Dict[str, FileLock] = {}
+        self.rate_limiters: Dict[str, RateLimiter] = {
+            name: RateLimiter(name, directory, rate, burst)
+            for name, (rate, burst) in (rate_limits or {}).items()
+            if rate > 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "WorkerCoordinator":
+        return cls(
+            os.getenv("COORDINATION_DIR", "./data/coordination"),
+            single_flight_timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "120")),
+            rate_limits={
+                "google": (float(os.getenv("GOOGLE_RATE_LIMIT", "0")), int(os.getenv("GOOGLE_RATE_BURST", "1"))),
+                "openai": (float(os.getenv("OPENAI_RATE_LIMIT", "0")), int(os.getenv("OPENAI_RATE_BURST", "1")))
+            }
+        )
+
+    def _stripe_lock(self, key: str) -> FileLock:
+        # One reentrant lock object per stripe, so requests in this process
+        # never block each other on a stripe; it only excludes other workers
+        stripe = int(hashlib.md5(key.encode()).hexdigest(), 16) % _LOCK_STRIPES
+        lock = self._stripe_locks.get(stripe)
+        if lock is None:
+            lock = self._stripe_locks[stripe] = FileLock(
+                os.path.join(self.directory, f"flight-{stripe:03d}.lock"), thread_local=False
+            )
+        return lock
+
+    @asynccontextmanager
+    async def single_flight(self, key: str) -> AsyncIterator[None]:
+        """
+        Hold the refresh lock for a cache key. Callers should check the cache
+        again once inside, as another request may just have filled it. If the
+        lock isn't released within single_flight_timeout the caller proceeds
+        without it rather than failing the request.
+        """
+        entry = self._local_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        local_lock = entry[0]
+        file_lock = self._stripe_lock(key)
+        deadline = time.monotonic() + self.single_flight_timeout
+        waited = local_lock.locked()
+        local_acquired = file_acquired = False
+        try:
+            try:
+                await asyncio.wait_for(local_lock.acquire(), self.single_flight_timeout)
+                local_acquired = True
+            except asyncio.TimeoutError:
+                pass
+
+            while local_acquired:
+                try:
+                    file_lock.acquire(timeout=0)
+                    file_acquired = True
+                    break
+                except Timeout:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        break
+                    await asyncio.sleep(_POLL_INTERVAL_SECONDS)
+
+            if waited:
+                _single_flight_waits.add(1, {"outcome": "acquired" if file_acquired else "timeout"})
+            yield
+        finally:
+            if file_acquired:
+                file_lock.release()
+            if local_acquired:
+                local_lock.release()
+            entry[1] -= 1
+            if not entry[1]:
+                self._local_locks.pop(key, None)
+
+    def leader(self, name: str) -> bool:
+        """
+        Try to become the one worker that runs `name`. Leadership is kept
+        until the process exits, and passes to another worker when it does.
+        """
+        lock = self._leader_locks.get(name)
+        if lock is None:
+            lock = self._leader_locks[name] = FileLock(
+                os.path.join(self.directory, f"leader-{name}.lock"), thread_local=False
+            )
+        if lock.is_locked:
+            return True
+        try:
+            lock.acquire(timeout=0)
+            return True
+        except Timeout:
+            return False
+
+    async def throttle(self, upstream: str) -> None:
+        """Wait for a slot in the shared rate limit of an upstream, if it has one"""
+        limiter = self.rate_limiters.get(upstream)
+        if limiter:
+            await limiter.acquire()
@@ -1,11 +1,11 @@
 import aiohttp
 import asyncio
 from bs4 import BeautifulSoup
-from typing import List, Dict, Optional, Union
+from typing import Any, Awaitable, List, Dict, Optional, Tuple, Union
 from models.request import AnalysisRequest
 from models.response import (
-    SearchResult, SearchResponse, SwotAnalysis,
-    ComparisonResult, DataSourceInfo
+    SearchResult, SearchResponse, SwotAnalysis, DataSourceInfo,
+    SimilarCompetitor, SimilarCompetitorsResponse
 )
 from models.competitor import (
     CompetitorProfile, CompanyInfo, MarketPosition,
@@ -14,11 +14,87 @@ from models.competitor import (
 )
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APITimeoutError, AsyncOpenAI
 import json
+import orjson
 from urllib.parse import urlparse, quote_plus
-from datetime import datetime
-from .db_manager import DBManager
+from datetime import datetime, timedelta
+from .db_manager import (
+    DBManager, ANALYSIS_FAILED, PROFILE_SECTIONS, analysis_failed, canonical_website, competitor_summary
+)
+from .coordination import WorkerCoordinator
+from .telemetry import span, traced, http_trace_config, record_cache_lookup
+from .usage import UsageTracker, record_llm_usage
+from .hedging import Hedger
+from .dedup import group_near_duplicates, record_duplicates_skipped
+from .deadline import Deadline, DeadlineExceeded, http_timeout, time_remaining
+from .context_builder import (
+    ContextBuilder, SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS,
+    COMPARISON_RESULT_FIELDS, COMPARISON_PROFILE_FIELDS
+)
+
+# Model and prompt structure of each competitor profile section
+PROFILE_SECTION_MODELS = {
+    "company_info": CompanyInfo,
+    "market_position": MarketPosition,
+    "product_service": ProductService,
+    "online_presence": OnlinePresence,
+    "customer_sentiment": CustomerSentiment,
+    "business_growth": BusinessGrowth,
+    "tech_stack": TechnologyStack,
+    "marketing_strategy": MarketingStrategy
+}
+
+PROFILE_SECTION_STRUCTURE = {
+    "company_info": """{
+                                "name": "string",
+                                "website": "string",
+                                "industry": "string",
+                                "founded_year": null,
+                                "location": null,
+                                "founders": null
+                            }""",
+    "market_position": """{
+                                "target_audience": ["string"],
+                                "brand_reputation": "string",
+                                "value_propositions": ["string"]
+                            }""",
+    "product_service": """{
+                                "features": ["string"],
+                                "pricing": {"plan_name": "price"},
+                                "differentiators": ["string"]
+                            }""",
+    "online_presence": """{
+                                "website_traffic": null,
+                                "domain_authority": null,
+                                "social_media": {},
+                                "content_strategy": null
+                            }""",
+    "customer_sentiment": """{
+                                "positive_feedback": ["string"],
+                                "negative_feedback": ["string"],
+                                "common_pain_points": ["string"],
+                                "praise_points": ["string"]
+                            }""",
+    "business_growth": """{
+                                "funding_rounds": null,
+                                "revenue_estimates": null,
+                                "partnerships": ["string"],
+                                "market_growth": "string"
+                            }""",
+    "tech_stack": """{
+                                "tools": ["string"],
+                                "ai_ml_usage": null,
+                                "frameworks": ["string"],
+                                "platform_details": "string"
+                            }""",
+    "marketing_strategy": """{
+                                "campaigns": ["string"],
+                                "channels": ["string"],
+                                "positioning": "string",
+                                "engagement_metrics": null
+                            }"""
+}
 
 class DataCollector:
     def __init__(self):
@@ -39,75 +115,373 @@ class DataCollector:
         if not self.google_search_url:
             raise ValueError("GOOGLE_CUSTOM_SEARCH_URL environment variable is not set")
         
-        self.client = OpenAI(api_key=self.openai_api_key)
+        # Async so that LLM calls don't block other requests and can be hedged
+        self.client = AsyncOpenAI(api_key=self.openai_api_key)
+        self.hedger = Hedger.from_env()
+        # Competitor summaries are embedded with this model for similarity search
+        self.embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
         self.db_manager = DBManager()
+        # Single-flight and upstream rate limits shared with other workers
+        self.coordinator = WorkerCoordinator.from_env()
+
+        # Token budget for the data section of SWOT/comparison prompts
+        self.context_builder = ContextBuilder(
+            max_tokens=int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "3000"))
+        )
 
     async def collect_data(self, request: AnalysisRequest) -> SearchResponse:
         """Collect and analyze data about competitors"""
-        data_source_info = DataSourceInfo()
-        
-        # Check cache for search results
-        cached_results = await self.db_manager.get_search_results(request.query)
-        if cached_results:
-            results = []
-            for result in cached_results:
-                result_data = result.copy()
-                result_data['data_source'] = 'cached'
-                result_data['last_updated'] = datetime.fromisoformat(result_data.get('last_updated', datetime.utcnow().isoformat()))
-                results.append(SearchResult(**result_data))
-            data_source_info.search_results_from_cache = True
-            data_source_info.last_cache_update = results[0].last_updated if results else None
-        else:
-            # Perform new search
-            results = await self._search_google(request.query, request.num_results)
-            # Store new results
-            await self.db_manager.store_search_results(
-                request.query,
-                [result.dict() for result in results]
+        return SearchResponse.model_validate_json(await self.collect_data_json(request))
+
+    @traced("collect_data", "request")
+    async def collect_data_json(self, request: AnalysisRequest) -> bytes:
+        """
+        Collect and analyze data about competitors, returning the serialized
+        SearchResponse. Cached documents were validated before they were
+        stored, so they are spliced into the response as-is instead of being
+        rebuilt through pydantic and serialized again.
+
+        If the request has a latency budget, each stage runs within what is
+        left of it. Stages cut off by the deadline are left out of the
+        response and listed in data_source_info.
+        """
+        with UsageTracker() as usage, Deadline.from_ms(request.latency_budget_ms) as deadline:
+            data_source_info = DataSourceInfo()
+
+            # Search results
+            results, results_json = [], []
+            loaded = await self._run_section(
+                deadline, "results", self._load_search_results(request.query, request.num_results),
+                data_source_info
             )
-            for result in results:
-                result.data_source = 'new'
-                result.last_updated = datetime.utcnow()
-
-        # Analyze competitors
-        competitor_profiles = []
-        if request.competitors:
-            for competitor in request.competitors:
-                # Check cache for competitor data
-                cached_data = await self.db_manager.get_competitor_data(competitor)
-                if cached_data:
-                    cached_data['data_source'] = 'cached'
-                    cached_data['last_updated'] = datetime.fromisoformat(cached_data.get('last_updated', datetime.utcnow().isoformat()))
-                    profile = CompetitorProfile(**cached_data)
-                    data_source_info.competitors_from_cache.append(competitor)
+            if loaded:
+                results, results_json, cached_metadata = loaded
+                if cached_metadata is not None:
+                    usage.add_saved("search_results", cached_metadata.get('llm_tokens', 0))
+                    data_source_info.search_results_from_cache = True
+                    data_source_info.last_cache_update = results[0].last_updated if results else None
+
+            # Analyze competitors. They are loaded concurrently so that one
+            # slow site doesn't use up the budget of the others.
+            competitor_profiles = []
+            profiles_json = []
+            if request.competitors:
+                if deadline.expired():
+                    data_source_info.skipped_competitors.extend(request.competitors)
+                    outcomes = []
                 else:
-                    profile = await self._analyze_competitor(competitor)
-                    profile.data_source = 'new'
-                    profile.last_updated = datetime.utcnow()
-                    # Store new competitor data
-                    await self.db_manager.store_competitor_data(profile.dict())
-                    data_source_info.fresh_competitors.append(competitor)
-                competitor_profiles.append(profile)
-
-        # Generate SWOT analysis
-        swot_analysis = await self._generate_swot_analysis(request.query, results, competitor_profiles)
-
-        # Generate comparison if competitors are provided
-        comparison = None
-        if competitor_profiles:
-            comparison = ComparisonResult(
-                competitors=competitor_profiles,
-                competitive_advantages=await self._generate_competitive_analysis(results, competitor_profiles, True),
-                competitive_disadvantages=await self._generate_competitive_analysis(results, competitor_profiles, False)
+                    outcomes = await asyncio.gather(
+                        *(deadline.run(self._load_competitor(competitor)) for competitor in request.competitors),
+                        return_exceptions=True
+                    )
+                for competitor, outcome in zip(request.competitors, outcomes):
+                    if isinstance(outcome, DeadlineExceeded):
+                        data_source_info.pending_competitors.append(competitor)
+                        continue
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                    profile, profile_json, cached_metadata, refreshed_sections = outcome
+                    if refreshed_sections:
+                        data_source_info.refreshed_sections[competitor] = refreshed_sections
+                    if cached_metadata is not None:
+                        usage.add_saved("competitors", cached_metadata.get('llm_tokens', 0))
+                        data_source_info.competitors_from_cache.append(competitor)
+                    else:
+                        data_source_info.fresh_competitors.append(competitor)
+                    competitor_profiles.append(profile)
+                    profiles_json.append(profile_json)
+
+            # Generate SWOT analysis
+            swot_analysis = await self._run_section(
+                deadline, "swot_analysis",
+                self._generate_swot_analysis(request.query, results, competitor_profiles),
+                data_source_info,
+                default=SwotAnalysis(strengths=[], weaknesses=[], opportunities=[], threats=[])
+            )
+
+            # Generate comparison if competitors are provided
+            comparison = None
+            if competitor_profiles:
+                comparison = {
+                    "main_product": None,
+                    "competitors": profiles_json,
+                    "competitive_advantages": await self._run_section(
+                        deadline, "competitive_advantages",
+                        self._generate_competitive_analysis(results, competitor_profiles, True),
+                        data_source_info, default=[]
+                    ),
+                    "competitive_disadvantages": await self._run_section(
+                        deadline, "competitive_disadvantages",
+                        self._generate_competitive_analysis(results, competitor_profiles, False),
+                        data_source_info, default=[]
+                    )
+                }
+
+            data_source_info.deadline_exceeded = bool(
+                data_source_info.skipped_competitors or data_source_info.pending_competitors or
+                data_source_info.skipped_sections or data_source_info.pending_sections
             )
+            return orjson.dumps({
+                "query": request.query,
+                "results": results_json,
+                "swot_analysis": swot_analysis.model_dump(),
+                "comparison": comparison,
+                "data_source_info": data_source_info.model_dump(),
+                "diagnostics": usage.diagnostics.model_dump()
+            })
 
-        return SearchResponse(
-            query=request.query,
-            results=results,
-            swot_analysis=swot_analysis,
-            comparison=comparison,
-            data_source_info=data_source_info
+    async def can_serve_from_cache(self, request: AnalysisRequest) -> bool:
+        """
+        Whether a request's search results and competitor profiles are all
+        cached, so that it needs no searches or profiling, only the SWOT and
+        comparison calls
+        """
+        return await self.db_manager.is_cached(request.query, request.competitors or [])
+
+    async def _run_section(
+        self,
+        deadline: Deadline,
+        section: str,
+        stage: Awaitable,
+        data_source_info: DataSourceInfo,
+        default: Any = None
+    ) -> Any:
+        """
+        Run one section of the response within the deadline. Returns `default`
+        and records the section as skipped or pending if the deadline passes.
+        """
+        if deadline.expired():
+            stage.close()
+            data_source_info.skipped_sections.append(section)
+            return default
+        try:
+            return await deadline.run(stage)
+        except DeadlineExceeded:
+            data_source_info.pending_sections.append(section)
+            return default
+
+    async def _load_search_results(self, query: str, num_results: int) -> Tuple[List[SearchResult], Any, Optional[Dict]]:
+        """
+        Return search results, their JSON form and, if they came from the
+        cache, the cache metadata. On a miss only one request (across all
+        workers) runs the search; the others wait for it and are then served
+        from the cache.
+        """
+        cached_results = await self.db_manager.get_search_results_document(query, num_results)
+        if cached_results is None:
+            async with self.coordinator.single_flight(f"search_results:{query}"):
+                cached_results = await self.db_manager.get_search_results_document(query, num_results)
+                if cached_results is None:
+                    record_cache_lookup("search_results", False)
+                    results = await self.refresh_search_results(query, num_results)
+                    return results, [result.model_dump() for result in results], None
+        record_cache_lookup("search_results", True)
+
+        cached_data, document, metadata = cached_results
+        results = [
+            SearchResult.model_construct(**{**result, 'last_updated': datetime.fromisoformat(result['last_updated'])})
+            for result in cached_data
+        ]
+        return results, orjson.Fragment(self._cached_document(cached_data, document)), metadata
+
+    async def _load_competitor(self, competitor: str) -> Tuple[CompetitorProfile, Any, Optional[Dict], List[str]]:
+        """
+        Return a competitor profile, its JSON form, the cache metadata if it
+        came from the cache, and the sections that were regenerated if only
+        some of a cached profile's sections were stale.
+        """
+        cached_data = await self.db_manager.get_competitor_document(competitor)
+        if cached_data is None or self.db_manager.stale_sections(cached_data[0], cached_data[2]):
+            async with self.coordinator.single_flight(f"competitors:{competitor}"):
+                cached_data = await self.db_manager.get_competitor_document(
+                    competitor, record_access=cached_data is None
+                )
+                if cached_data is None:
+                    record_cache_lookup("competitors", False)
+                    profile = await self.refresh_competitor(competitor)
+                    return profile, profile.model_dump(), None, []
+                stale = self.db_manager.stale_sections(cached_data[0], cached_data[2])
+                if stale:
+                    profile = await self.refresh_competitor(competitor, cached_data)
+                    # A failed partial refresh serves the cached profile as is
+                    if profile.data_source == 'new':
+                        record_cache_lookup("competitors", False)
+                        return profile, profile.model_dump(), None, stale
+        record_cache_lookup("competitors", True)
+
+        data, document, metadata = cached_data
+        document = self._cached_document(data, document)
+        return CompetitorProfile.model_validate_json(document), orjson.Fragment(document), metadata, []
+
+    async def refresh_search_results(self, query: str, num_results: int) -> List[SearchResult]:
+        """Search and analyze a query, storing the results in the cache"""
+        with UsageTracker() as usage:
+            results = await self._search_google(query, num_results)
+        for result in results:
+            result.data_source = 'new'
+            result.last_updated = datetime.utcnow()
+        # Store new results in the form they are served on a cache hit
+        await self.db_manager.store_search_results(
+            query,
+            [{**result.model_dump(), 'data_source': 'cached'} for result in results],
+            llm_tokens=usage.total_tokens()
         )
+        return results
+
+    async def refresh_competitor(
+        self,
+        competitor: str,
+        cached: Optional[Tuple[Dict, bytes, Dict]] = None,
+        within: timedelta = timedelta(0)
+    ) -> CompetitorProfile:
+        """
+        Analyze a competitor, storing the profile in the cache. Given the
+        cached document (see get_competitor_document), only the sections
+        that are stale, or will be within `within`, are regenerated; if that
+        fails the cached profile is returned unchanged and the refresh is
+        postponed (see DBManager.postpone_competitor_refresh). A cached
+        placeholder of a failed analysis is analyzed again in full.
+        """
+        stale = None
+        if cached is not None:
+            data, document, metadata = cached
+            stale = self.db_manager.stale_sections(data, metadata, within)
+            if not stale:
+                return CompetitorProfile.model_validate_json(self._cached_document(data, document))
+            if analysis_failed(data):
+                stale = None
+
+        with UsageTracker() as usage:
+            if stale is None:
+                profile = await self._analyze_competitor(competitor)
+            else:
+                sections = await self._refresh_profile_sections(competitor, data, stale)
+                if sections is None:
+                    await self.db_manager.postpone_competitor_refresh(competitor, metadata)
+                    return CompetitorProfile.model_validate_json(self._cached_document(data, document))
+                profile = CompetitorProfile(**{**data, **sections})
+        profile.data_source = 'new'
+        profile.last_updated = datetime.utcnow()
+        # Key the profile by the identifier it is requested with, so that
+        # names (not just URLs) hit the cache next time
+        stored = {**profile.model_dump(), 'data_source': 'cached'}
+        await self.db_manager.store_competitor_data(
+            stored,
+            # A partially refreshed profile is still worth what the full analysis cost
+            llm_tokens=usage.total_tokens() if stale is None else max(usage.total_tokens(), metadata.get('llm_tokens', 0)),
+            identifier=competitor,
+            refreshed_sections=stale,
+            previous_metadata=metadata if stale is not None else None
+        )
+        await self.index_competitors([(self.db_manager.competitor_document_id(competitor), stored)])
+        return profile
+
+    async def index_competitors(self, profiles: List[Tuple[str, Dict]]) -> int:
+        """
+        Embed (document ID, profile) pairs into the similarity index. Profiles
+        whose summary hasn't changed since they were last embedded are
+        skipped, and placeholders of failed analyses are left out (or removed,
+        if indexed before). Returns the number of profiles embedded.
+        """
+        try:
+            failed = [doc_id for doc_id, data in profiles if analysis_failed(data)]
+            if failed:
+                await self.db_manager.remove_competitor_embeddings(failed)
+            summaries = {
+                doc_id: (data, competitor_summary(data)) for doc_id, data in profiles
+                if doc_id not in failed
+            }
+            indexed = await self.db_manager.get_indexed_summaries(list(summaries))
+            changed = [
+                (doc_id, data, summary) for doc_id, (data, summary) in summaries.items()
+                if indexed.get(doc_id) != self.db_manager.summary_hash(summary)
+            ]
+            if not changed:
+                return 0
+
+            embeddings = await self._create_embeddings([summary for _, _, summary in changed])
+            await self.db_manager.store_competitor_embeddings([
+                {"id": doc_id, "data": data, "summary": summary, "embedding": embedding}
+                for (doc_id, data, summary), embedding in zip(changed, embeddings)
+            ])
+            return len(changed)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error indexing competitors: {str(e)}")
+            return 0
+
+    async def backfill_competitor_index(self, batch_size: int = 100) -> int:
+        """Index stored profiles that are missing from the similarity index or out of date"""
+        indexed, offset = 0, 0
+        while True:
+            batch = await self.db_manager.get_competitor_batch(offset, batch_size)
+            if not batch:
+                break
+            indexed += await self.index_competitors(batch)
+            offset += len(batch)
+        print(f"Indexed {indexed}/{offset} competitor profiles for similarity search")
+        return indexed
+
+    async def find_similar_competitors(
+        self,
+        to: str,
+        k: int,
+        industry: Optional[str] = None
+    ) -> Optional[SimilarCompetitorsResponse]:
+        """
+        Return the k cached competitors most similar to the competitor `to`,
+        or None if there is no profile for it. Only the index is queried;
+        a profile that isn't indexed yet is embedded first. A company may be
+        cached under both its name and its URL, so results are deduplicated
+        by website and never include the competitor itself.
+        """
+        entry = await self.db_manager.get_competitor_embedding(to)
+        if entry is None:
+            cached = await self.db_manager.get_competitor_document(to, record_access=False)
+            if cached is None:
+                return None
+            await self.index_competitors([(self.db_manager.competitor_document_id(to), cached[0])])
+            entry = await self.db_manager.get_competitor_embedding(to)
+            if entry is None:
+                return None
+
+        embedding, metadata = entry
+        source = canonical_website(metadata.get('website', ''))
+        # Fetch extra neighbours to make up for duplicates, more if that isn't enough
+        limit = 2 * k + 1
+        while True:
+            candidates = await self.db_manager.query_similar_competitors(
+                embedding, limit, industry, exclude_identifier=to
+            )
+            seen = {source} if source else set()
+            similar = []
+            for competitor in candidates:
+                key = canonical_website(competitor['website']) or competitor['name'].strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    similar.append(competitor)
+            if len(similar) >= k or len(candidates) < limit:
+                break
+            limit *= 2
+        return SimilarCompetitorsResponse(
+            to=to,
+            industry=industry,
+            competitors=[SimilarCompetitor(**competitor) for competitor in similar[:k]]
+        )
+
+    def _cached_document(self, data: Union[Dict, List[Dict]], document: bytes) -> bytes:
+        """
+        Return the stored JSON in the form it is served on a cache hit.
+        Documents stored before data_source was written as 'cached' are
+        patched and re-serialized.
+        """
+        items = data if isinstance(data, list) else [data]
+        if all(item.get('data_source') == 'cached' for item in items):
+            return document
+        for item in items:
+            item['data_source'] = 'cached'
+        return orjson.dumps(data)
 
     async def _search_google(self, query: str, num_results: int) -> List[SearchResult]:
         """Search using Google Custom Search API"""
@@ -115,19 +489,29 @@ class DataCollector:
         try:
             search_url = f"{self.google_search_url}?key={self.google_api_key}&cx={self.google_search_id}&q={quote_plus(query)}&num={num_results}"
             
-            async with aiohttp.ClientSession() as session:
+            await self.coordinator.throttle("google")
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()], timeout=http_timeout()) as session:
                 async with session.get(search_url) as response:
                     if response.status == 200:
                         data = await response.json()
                         items = data.get('items', [])
+
+                        # Near-duplicate results reuse the analysis of the
+                        # first result in their group
+                        representatives = group_near_duplicates(items)
+                        record_duplicates_skipped(sum(r != i for i, r in enumerate(representatives)))
+                        analyses = {}
                         
-                        for item in items:
+                        for index, item in enumerate(items):
                             title = item.get('title', '')
                             url = item.get('link', '')
                             snippet = item.get('snippet', '')
                             
                             # Analyze the content using OpenAI
-                            analysis = await self._analyze_content(title, snippet)
+                            representative = representatives[index]
+                            if representative not in analyses:
+                                analyses[representative] = await self._analyze_content(title, snippet)
+                            analysis = analyses[representative]
                             
                             results.append(SearchResult(
                                 title=title,
@@ -139,28 +523,81 @@ class DataCollector:
                             ))
                     else:
                         print(f"Error in Google search API: {response.status}")
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error in Google search: {str(e)}")
         
         return results
 
     async def _get_company_url(self, company_name: str) -> Optional[str]:
-        """Get company website URL using Google Custom Search"""
+        """Get company website URL from the resolution index or Google Custom Search"""
+        cached = await self.db_manager.get_company_url(company_name)
+        record_cache_lookup("company_urls", cached is not None)
+        if cached is not None:
+            return cached.get('website')
+
         try:
             search_url = f"{self.google_search_url}?key={self.google_api_key}&cx={self.google_search_id}&q={quote_plus(company_name + ' official website')}&num=1"
             
-            async with aiohttp.ClientSession() as session:
+            await self.coordinator.throttle("google")
+            async with aiohttp.ClientSession(trace_configs=[http_trace_config()], timeout=http_timeout()) as session:
                 async with session.get(search_url) as response:
                     if response.status == 200:
                         data = await response.json()
                         items = data.get('items', [])
-                        if items:
-                            return items[0].get('link')
+                        website = canonical_website(items[0].get('link', '')) if items else None
+                        # Cache both hits and misses; misses expire sooner
+                        await self.db_manager.store_company_url(company_name, website)
+                        return website
             return None
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error finding company URL for {company_name}: {str(e)}")
             return None
 
+    async def _create_chat_completion(self, operation: str, **kwargs):
+        """
+        Call the chat completions API, traced as an "llm" stage operation and
+        with its token usage recorded against the current request. Each
+        attempt waits for a slot in the shared OpenAI rate limit first, and
+        slow calls may be hedged with a second attempt. Within a request's
+        latency budget the call times out when the budget does, without
+        retries, and raises DeadlineExceeded.
+        """
+        client = self.client
+        remaining = time_remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded()
+            client = self.client.with_options(timeout=remaining, max_retries=0)
+
+        async def attempt():
+            await self.coordinator.throttle("openai")
+            with span(f"llm.{operation}", "llm", model=kwargs.get("model", "")):
+                return await client.chat.completions.create(**kwargs)
+
+        try:
+            response = await self.hedger.run(operation, attempt)
+        except APITimeoutError:
+            if remaining is not None and time_remaining() <= 0:
+                raise DeadlineExceeded()
+            raise
+        record_llm_usage(operation, response.usage)
+        return response
+
+    async def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts in one call, sharing the OpenAI rate limit with chat
+        completions and with token usage recorded the same way
+        """
+        await self.coordinator.throttle("openai")
+        with span("llm.embed_competitors", "llm", model=self.embedding_model):
+            response = await self.client.embeddings.create(model=self.embedding_model, input=texts)
+        record_llm_usage("embed_competitors", response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
     async def _analyze_content(self, title: str, content: str) -> str:
         """Analyze content using OpenAI"""
         try:
@@ -176,7 +613,8 @@ class DataCollector:
             }}
             """
 
-            response = self.client.chat.completions.create(
+            response = await self._create_chat_completion(
+                "analyze_content",
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are an expert business analyst. Provide your analysis in JSON format."},
@@ -187,125 +625,125 @@ class DataCollector:
             
             analysis_data = json.loads(response.choices[0].message.content)
             return analysis_data.get('analysis', "Analysis not available")
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error in OpenAI analysis: {str(e)}")
             return "Analysis not available"
 
-    async def _analyze_competitor(self, competitor: str) -> CompetitorProfile:
-        """Analyze a competitor comprehensively"""
-        try:
-            # Get competitor website if not provided
-            website = competitor if competitor.startswith(('http://', 'https://')) else await self._get_company_url(competitor)
-            if not website:
-                raise ValueError(f"Could not find website for {competitor}")
+    async def _fetch_site_summary(self, website: str) -> Tuple[str, str]:
+        """Fetch a competitor's website and return its title and meta description"""
+        async with aiohttp.ClientSession(trace_configs=[http_trace_config()], timeout=http_timeout()) as session:
+            async with session.get(website) as response:
+                if response.status != 200:
+                    raise ValueError(f"{website} returned HTTP {response.status}")
+                html = await response.text()
 
-            # Collect data about the competitor
-            async with aiohttp.ClientSession() as session:
-                async with session.get(website) as response:
-                    if response.status == 200:
-                        html = await response.text()
-                        soup = BeautifulSoup(html, 'html.parser')
-                        
-                        # Extract basic information
-                        title = soup.title.string if soup.title else website
-                        description = ""
-                        meta_desc = soup.find('meta', {'name': 'description'})
-                        if meta_desc:
-                            description = meta_desc.get('content', '')
-
-                        # Use OpenAI to analyze the competitor
-                        analysis_prompt = f"""
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Extract basic information
+        title = soup.title.string if soup.title else website
+        description = ""
+        meta_desc = soup.find('meta', {'name': 'description'})
+        if meta_desc:
+            description = meta_desc.get('content', '')
+        return title, description
+
+    async def _generate_profile_sections(
+        self,
+        website: str,
+        sections: List[str],
+        known: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Ask the LLM for the given profile sections of a company and return
+        them validated, keyed by section. `known` holds sections that are
+        still fresh and are given as context instead of being regenerated.
+        """
+        title, description = await self._fetch_site_summary(website)
+
+        context = ""
+        if known:
+            context = f"""
+                        Current profile (for context; do not repeat these sections):
+                        {json.dumps(known)}
+                        """
+        structure = ",\n".join(f'"{section}": {PROFILE_SECTION_STRUCTURE[section]}' for section in sections)
+
+        # Use OpenAI to analyze the competitor
+        analysis_prompt = f"""
                         Please analyze this company website and provide a detailed analysis in JSON format.
 
                         Website Information:
                         URL: {website}
                         Title: {title}
                         Description: {description}
-
+                        {context}
                         Provide your analysis as a JSON object with the following structure:
                         {{
-                            "company_info": {{
-                                "name": "string",
-                                "website": "string",
-                                "industry": "string",
-                                "founded_year": null,
-                                "location": null,
-                                "founders": null
-                            }},
-                            "market_position": {{
-                                "target_audience": ["string"],
-                                "brand_reputation": "string",
-                                "value_propositions": ["string"]
-                            }},
-                            "product_service": {{
-                                "features": ["string"],
-                                "pricing": {{"plan_name": "price"}},
-                                "differentiators": ["string"]
-                            }},
-                            "online_presence": {{
-                                "website_traffic": null,
-                                "domain_authority": null,
-                                "social_media": {{}},
-                                "content_strategy": null
-                            }},
-                            "customer_sentiment": {{
-                                "positive_feedback": ["string"],
-                                "negative_feedback": ["string"],
-                                "common_pain_points": ["string"],
-                                "praise_points": ["string"]
-                            }},
-                            "business_growth": {{
-                                "funding_rounds": null,
-                                "revenue_estimates": null,
-                                "partnerships": ["string"],
-                                "market_growth": "string"
-                            }},
-                            "tech_stack": {{
-                                "tools": ["string"],
-                                "ai_ml_usage": null,
-                                "frameworks": ["string"],
-                                "platform_details": "string"
-                            }},
-                            "marketing_strategy": {{
-                                "campaigns": ["string"],
-                                "channels": ["string"],
-                                "positioning": "string",
-                                "engagement_metrics": null
-                            }}
+                            {structure}
                         }}
                         """
 
-                        response = self.client.chat.completions.create(
-                            model="gpt-3.5-turbo",
-                            messages=[
-                                {"role": "system", "content": "You are an expert business analyst. Provide your analysis in JSON format."},
-                                {"role": "user", "content": analysis_prompt}
-                            ],
-                            response_format={ "type": "json_object" }
-                        )
+        response = await self._create_chat_completion(
+            "analyze_competitor" if known is None else "refresh_competitor_sections",
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are an expert business analyst. Provide your analysis in JSON format."},
+                {"role": "user", "content": analysis_prompt}
+            ],
+            response_format={ "type": "json_object" }
+        )
 
-                        analysis_data = json.loads(response.choices[0].message.content)
-                        
-                        return CompetitorProfile(
-                            company_info=CompanyInfo(**analysis_data['company_info']),
-                            market_position=MarketPosition(**analysis_data['market_position']),
-                            product_service=ProductService(**analysis_data['product_service']),
-                            online_presence=OnlinePresence(**analysis_data['online_presence']),
-                            customer_sentiment=CustomerSentiment(**analysis_data['customer_sentiment']),
-                            business_growth=BusinessGrowth(**analysis_data['business_growth']),
-                            tech_stack=TechnologyStack(**analysis_data['tech_stack']),
-                            marketing_strategy=MarketingStrategy(**analysis_data['marketing_strategy']),
-                            last_updated=datetime.utcnow(),
-                            data_source='new'
-                        )
+        analysis_data = json.loads(response.choices[0].message.content)
+        return {
+            section: PROFILE_SECTION_MODELS[section](**analysis_data[section])
+            for section in sections
+        }
 
+    async def _refresh_profile_sections(self, competitor: str, data: Dict, sections: List[str]) -> Optional[Dict]:
+        """
+        Regenerate the given sections of a cached profile. Returns the new
+        sections as dicts, or None if they could not be generated.
+        """
+        try:
+            website = competitor if competitor.startswith(('http://', 'https://')) else data['company_info']['website']
+            known = {
+                section: value for section, value in data.items()
+                if section in PROFILE_SECTION_MODELS and section not in sections
+            }
+            generated = await self._generate_profile_sections(website, sections, known)
+            return {section: model.model_dump() for section, model in generated.items()}
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Error refreshing {', '.join(sections)} of competitor {competitor}: {str(e)}")
+            return None
+
+    async def _analyze_competitor(self, competitor: str) -> CompetitorProfile:
+        """Analyze a competitor comprehensively"""
+        try:
+            # Get competitor website if not provided
+            website = competitor if competitor.startswith(('http://', 'https://')) else await self._get_company_url(competitor)
+            if not website:
+                raise ValueError(f"Could not find website for {competitor}")
+
+            sections = await self._generate_profile_sections(website, PROFILE_SECTIONS)
+            return CompetitorProfile(
+                **sections,
+                last_updated=datetime.utcnow(),
+                data_source='new'
+            )
+
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error analyzing competitor {competitor}: {str(e)}")
             # Return a minimal profile with error information
             return CompetitorProfile(
                 company_info=CompanyInfo(
                     name=competitor,
-                    website=website if 'website' in locals() else "Error",
+                    website=(website if 'website' in locals() else None) or "Error",
                     industry="Unknown",
                     founded_year=None,
                     location=None,
@@ -314,7 +752,7 @@ class DataCollector:
                 market_position=MarketPosition(
                     target_audience=["Unknown"],
                     brand_reputation="Unknown",
-                    value_propositions=["Analysis failed"]
+                    value_propositions=[ANALYSIS_FAILED]
                 ),
                 product_service=ProductService(
                     features=["Analysis not available"],
@@ -355,24 +793,26 @@ class DataCollector:
                 data_source='error'
             )
 
+    def _report_context_trim(self, stage: str, stats: Dict) -> None:
+        """Log how much prompt context was trimmed to fit the token budget"""
+        dropped = stats["results_dropped"] + stats["profiles_dropped"] + stats["duplicates_removed"]
+        if dropped or stats["chars_trimmed"]:
+            print(
+                f"Trimmed {stage} context to ~{stats['estimated_tokens']}/{stats['budget_tokens']} tokens: "
+                f"dropped {stats['results_dropped']} results, {stats['profiles_dropped']} profiles, "
+                f"{stats['duplicates_removed']} duplicates, {stats['chars_trimmed']} chars"
+            )
+
     async def _generate_swot_analysis(self, query: str, results: List[SearchResult], competitor_profiles: List[CompetitorProfile]) -> SwotAnalysis:
         """Generate SWOT analysis using OpenAI"""
         try:
-            # Prepare content for analysis
-            content = f"Query: {query}\n\nSearch Results:\n"
-            for result in results:
-                content += f"\nTitle: {result.title}\nSnippet: {result.snippet}\nAnalysis: {result.analysis}\n"
-
-            if competitor_profiles:
-                content += "\nCompetitor Profiles:\n"
-                for profile in competitor_profiles:
-                    content += f"""
-                    \nCompetitor: {profile.company_info.name}
-                    Industry: {profile.company_info.industry}
-                    Target Market: {', '.join(profile.market_position.target_audience)}
-                    Key Features: {', '.join(profile.product_service.features)}
-                    Value Propositions: {', '.join(profile.market_position.value_propositions)}
-                    """
+            # Prepare content for analysis within the token budget
+            content, context_stats = self.context_builder.build(
+                results, competitor_profiles,
+                SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS,
+                query=query
+            )
+            self._report_context_trim("SWOT", context_stats)
 
             prompt = f"""
             Based on the following data, generate a comprehensive SWOT analysis in JSON format:
@@ -388,7 +828,8 @@ class DataCollector:
             }}
             """
 
-            response = self.client.chat.completions.create(
+            response = await self._create_chat_completion(
+                "swot_analysis",
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are an expert business analyst. Provide your SWOT analysis in JSON format."},
@@ -405,6 +846,8 @@ class DataCollector:
                 opportunities=swot_data.get('opportunities', []),
                 threats=swot_data.get('threats', [])
             )
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error generating SWOT analysis: {str(e)}")
             return SwotAnalysis(
@@ -422,18 +865,11 @@ class DataCollector:
     ) -> List[str]:
         """Generate competitive advantages or disadvantages"""
         try:
-            content = "Search Results:\n"
-            for result in results:
-                content += f"\nTitle: {result.title}\nAnalysis: {result.analysis}\n"
-
-            content += "\nCompetitor Profiles:\n"
-            for profile in competitor_profiles:
-                content += f"""
-                \nCompetitor: {profile.company_info.name}
-                Features: {', '.join(profile.product_service.features)}
-                Target Market: {', '.join(profile.market_position.target_audience)}
-                Differentiators: {', '.join(profile.product_service.differentiators)}
-                """
+            content, context_stats = self.context_builder.build(
+                results, competitor_profiles,
+                COMPARISON_RESULT_FIELDS, COMPARISON_PROFILE_FIELDS
+            )
+            self._report_context_trim("competitive analysis", context_stats)
 
             prompt = f"""
             Based on the following data, analyze the {'advantages' if advantages else 'disadvantages'} and provide the results in JSON format:
@@ -446,7 +882,8 @@ class DataCollector:
             }}
             """
             
-            response = self.client.chat.completions.create(
+            response = await self._create_chat_completion(
+                "competitive_analysis",
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are an expert business analyst. Provide your analysis in JSON format."},
@@ -457,6 +894,8 @@ class DataCollector:
             
             analysis_data = json.loads(response.choices[0].message.content)
             return analysis_data.get('points', [])
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error generating competitive analysis: {str(e)}")
             return ["Analysis not available"]
\ No newline at end of file
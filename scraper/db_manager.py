@@ -1,36 +1,393 @@
+import asyncio
 import chromadb
 from chromadb.config import Settings
-from typing import Dict, List, Optional
-import json
+from typing import Any, Dict, List, Optional, Tuple
+import orjson
+import base64
 import hashlib
+import os
+import re
+import zlib
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from .telemetry import traced
+
+# How long each section of a cached competitor profile stays fresh. Company
+# facts rarely change, while sentiment and marketing go stale quickly; only
+# the stale sections of a profile are regenerated.
+PROFILE_SECTION_TTL_DAYS = {
+    "company_info": 180,
+    "market_position": 60,
+    "product_service": 30,
+    "online_presence": 30,
+    "customer_sentiment": 7,
+    "business_growth": 60,
+    "tech_stack": 90,
+    "marketing_strategy": 14
+}
+PROFILE_SECTIONS = list(PROFILE_SECTION_TTL_DAYS)
+
+# After a failed refresh, stale sections are served as they are for this long
+# before the refresh is tried again. The placeholder profile stored when a
+# whole analysis fails expires after the same time.
+PROFILE_REFRESH_RETRY_MINUTES = 30
+
+# Marks the placeholder profile stored when analyzing a competitor fails
+ANALYSIS_FAILED = "Analysis failed"
+
+# A profile is dropped once all of its sections are stale
+COMPETITOR_TTL_DAYS = max(PROFILE_SECTION_TTL_DAYS.values())
+SEARCH_RESULTS_TTL_DAYS = 7
+
+# Company name -> website resolutions rarely change, so keep them for a long
+# time. Names that could not be resolved are cached for a shorter period so a
+# later retry can still pick them up.
+COMPANY_URL_TTL_DAYS = 180
+COMPANY_URL_NEGATIVE_TTL_DAYS = 3
+
+# Legal suffixes stripped when normalizing company names
+_COMPANY_SUFFIXES = {
+    "inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation",
+    "co", "company", "gmbh", "plc", "sa", "ag", "bv", "pty"
+}
+
+# Cached documents are stored as "#v<version>:zlib:<base64 payload>", or as
+# plain JSON when that is smaller (small documents don't compress). Plain
+# JSON documents written before versioning, which have no format_version in
+# their metadata, are rewritten in the current format the first time they
+# are read.
+DOCUMENT_FORMAT_VERSION = 1
+_DOCUMENT_HEADER = f"#v{DOCUMENT_FORMAT_VERSION}:zlib:"
+_COMPRESSION_LEVEL = 6
+
+def encode_document(data: Any) -> Tuple[str, int]:
+    """
+    Serialize and compress a document, unless compressing makes it larger;
+    returns it with its uncompressed size
+    """
+    raw = orjson.dumps(data)
+    compressed = _DOCUMENT_HEADER + base64.b64encode(zlib.compress(raw, _COMPRESSION_LEVEL)).decode("ascii")
+    return (compressed if len(compressed) < len(raw) else raw.decode()), len(raw)
+
+def decode_document(document: str, metadata: Optional[Dict] = None) -> Tuple[bytes, bool]:
+    """
+    Return the JSON bytes of a stored document and whether it is in a legacy
+    (unversioned) format that should be migrated. Pass the document's
+    metadata so that plain JSON stored in the current format isn't taken
+    for a legacy document.
+    """
+    if document.startswith(_DOCUMENT_HEADER):
+        return zlib.decompress(base64.b64decode(document[len(_DOCUMENT_HEADER):])), False
+    if document.startswith("#v"):
+        raise ValueError(f"Unsupported document format: {document.split(':', 1)[0]}")
+    return document.encode(), (metadata or {}).get('format_version') is None
+
+def competitor_summary(data: Dict, max_items: int = 5) -> str:
+    """
+    Compact description of a competitor profile for similarity search: who
+    the company is, what it sells and to whom. Fast-changing sections
+    (sentiment, campaigns) are left out so that refreshing them doesn't
+    require a new embedding.
+    """
+    def items(section: str, field: str) -> str:
+        return ", ".join(str(item) for item in (data.get(section, {}).get(field) or [])[:max_items])
+
+    company = data.get('company_info', {})
+    lines = [
+        f"{company.get('name', '')} ({company.get('industry', '')})",
+        f"Audience: {items('market_position', 'target_audience')}",
+        f"Value: {items('market_position', 'value_propositions')}",
+        f"Features: {items('product_service', 'features')}",
+        f"Differentiators: {items('product_service', 'differentiators')}",
+        f"Positioning: {data.get('marketing_strategy', {}).get('positioning') or ''}"
+    ]
+    return "\n".join(lines)
+
+def analysis_failed(data: Dict) -> bool:
+    """Whether a competitor profile is the placeholder of a failed analysis"""
+    return data.get('company_info', {}).get('website') == "Error" or \
+        ANALYSIS_FAILED in (data.get('market_position', {}).get('value_propositions') or [])
+
+def canonical_website(url: str) -> Optional[str]:
+    """Reduce a URL to its canonical https://domain form"""
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    domain = (parsed.hostname or "").lower()
+    if domain.startswith("www."):
+        domain = domain[4:]
+    return f"https://{domain}" if domain else None
 
 class DBManager:
     def __init__(self):
-        self.client = chromadb.PersistentClient(path="./data")
+        # An embedded client owns ./data and must not be shared between
+        # processes. With several workers, run a Chroma server instead and
+        # set CHROMA_SERVER_HOST so that every worker connects to it.
+        host = os.getenv("CHROMA_SERVER_HOST")
+        if host:
+            self.client = chromadb.HttpClient(host=host, port=int(os.getenv("CHROMA_SERVER_PORT", "8001")))
+        else:
+            self.client = chromadb.PersistentClient(path="./data")
         
-        # Create collections if they don't exist
+        # Create collections if they don't exist. Every collection is read by
+        # ID and written with explicit embeddings, so none of them needs the
+        # default ONNX embedding model.
         self.competitors_collection = self.client.get_or_create_collection(
             name="competitors",
+            embedding_function=None,
             metadata={"description": "Competitor analysis data"}
         )
         
         self.search_results_collection = self.client.get_or_create_collection(
             name="search_results",
+            embedding_function=None,
             metadata={"description": "Google search results"}
         )
 
+        self.company_urls_collection = self.client.get_or_create_collection(
+            name="company_urls",
+            embedding_function=None,
+            metadata={"description": "Company name to website resolution index"}
+        )
+
+        self.cache_access_collection = self.client.get_or_create_collection(
+            name="cache_access",
+            embedding_function=None,
+            metadata={"description": "Access counts of cached entries, used for prewarming"}
+        )
+
+        # Embeddings of competitor profile summaries for similarity search.
+        # Unlike the other collections this one is queried by vector; the
+        # vector size is fixed by the first embedding stored, so changing
+        # the embedding model needs a fresh collection.
+        self.competitor_index_collection = self.client.get_or_create_collection(
+            name="competitor_index",
+            embedding_function=None,
+            metadata={"description": "Competitor profile summary embeddings", "hnsw:space": "cosine"}
+        )
+
+        # Vector size of each key-value collection, see _placeholder_embeddings()
+        self._dimensions: Dict[str, int] = {}
+
+        # Cache hits are counted in memory and merged into cache_access by
+        # flush_access_stats(), so reads don't each pay for a write
+        self._pending_access: Dict[str, Dict] = {}
+        # Access counts are only used for prewarming, so they aren't kept
+        # without it. Past ACCESS_STATS_MAX_PENDING distinct entries they are
+        # flushed right away instead of waiting for the prewarmer.
+        self.track_access = os.getenv("CACHE_PREWARM_ENABLED") == "1"
+        self.max_pending_access = int(os.getenv("ACCESS_STATS_MAX_PENDING", "10000"))
+        # Hit counts halve every ACCESS_STATS_HALF_LIFE_DAYS without accesses,
+        # so entries that were popular long ago don't crowd out current ones
+        self.access_half_life = timedelta(days=float(os.getenv("ACCESS_STATS_HALF_LIFE_DAYS", "7")))
+
     def _generate_id(self, data: str) -> str:
         """Generate a unique ID for a document"""
         return hashlib.md5(data.encode()).hexdigest()
 
+    def competitor_document_id(self, competitor_identifier: str) -> str:
+        """ID of a competitor's profile, which its index entry shares"""
+        return self._generate_id(competitor_identifier)
+
     def _add_timestamp(self, data: Dict) -> Dict:
         """Add timestamp to data for tracking freshness"""
         data['last_updated'] = datetime.utcnow().isoformat()
         return data
 
+    def _placeholder_embeddings(self, collection, count: int) -> List[List[float]]:
+        """
+        Key-value collections are only ever read by ID, so skip computing
+        real embeddings for them. The placeholders match the collection's
+        dimension: databases written before embeddings were skipped hold
+        the default model's 384-dimensional vectors, and Chroma rejects
+        vectors of any other size.
+        """
+        dimension = self._dimensions.get(collection.name)
+        if dimension is None:
+            dimension = self._dimensions[collection.name] = self._collection_dimension(collection)
+        return [[0.0] * dimension] * count
+
+    def _collection_dimension(self, collection) -> int:
+        """Vector size of a collection, or 1 for a collection that has never held one"""
+        dimension = getattr(getattr(collection, "_model", None), "dimension", None)
+        if dimension is None:
+            sample = collection.get(limit=1, include=['embeddings'])
+            if sample['ids']:
+                dimension = len(sample['embeddings'][0])
+        return dimension or 1
+
+    def _migrate_document(self, collection, doc_id: str, data: Any, metadata: Optional[Dict]) -> None:
+        """Rewrite a legacy plain-JSON document in the current compressed format"""
+        try:
+            document, raw_bytes = encode_document(data)
+            metadata = dict(metadata or {})
+            metadata.update(format_version=DOCUMENT_FORMAT_VERSION, raw_bytes=raw_bytes)
+            collection.upsert(
+                ids=[doc_id],
+                embeddings=self._placeholder_embeddings(collection, 1),
+                documents=[document],
+                metadatas=[metadata]
+            )
+        except Exception as e:
+            print(f"Error migrating document {doc_id}: {str(e)}")
+
+    def _normalize_company_name(self, name: str) -> str:
+        """Normalize a company name so that spelling variants share one key"""
+        words = re.sub(r"[^a-z0-9]+", " ", name.lower()).split()
+        while len(words) > 1 and words[-1] in _COMPANY_SUFFIXES:
+            words.pop()
+        return " ".join(words)
+
+    @traced("db.get_company_url", "db")
+    async def get_company_url(self, company_name: str) -> Optional[Dict]:
+        """
+        Look up a company in the resolution index.
+
+        Returns None on a miss. On a hit returns a dict whose 'website' is the
+        canonical URL, or None if the name is cached as unresolvable.
+        """
+        try:
+            key = self._normalize_company_name(company_name)
+            if not key:
+                return None
+
+            doc_id = self._generate_id(key)
+            result = self.company_urls_collection.get(
+                ids=[doc_id],
+                include=['documents', 'metadatas']
+            )
+            if not result or not result['documents']:
+                return None
+
+            document, legacy = decode_document(result['documents'][0], result['metadatas'][0])
+            data = orjson.loads(document)
+            if legacy:
+                self._migrate_document(self.company_urls_collection, doc_id, data, result['metadatas'][0])
+            ttl_days = COMPANY_URL_TTL_DAYS if data.get('website') else COMPANY_URL_NEGATIVE_TTL_DAYS
+            last_updated = datetime.fromisoformat(data.get('last_updated', '2000-01-01'))
+            if datetime.utcnow() - last_updated > timedelta(days=ttl_days):
+                self.company_urls_collection.delete(ids=[doc_id])
+                return None
+
+            return data
+        except Exception as e:
+            print(f"Error retrieving company URL: {str(e)}")
+            return None
+
+    @traced("db.store_company_url", "db")
+    async def store_company_url(
+        self,
+        company_name: str,
+        website: Optional[str],
+        aliases: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Store a company name resolution under the name and all of its aliases.
+        Pass website=None to record that the name could not be resolved.
+        """
+        return await self.import_company_urls([
+            {"name": company_name, "website": website, "aliases": aliases or []}
+        ])
+
+    @traced("db.import_company_urls", "db")
+    async def import_company_urls(self, companies: List[Dict]) -> bool:
+        """
+        Bulk load resolutions, e.g. a known competitor list. Each entry is a
+        dict with 'name', 'website' and optional 'aliases'.
+        """
+        try:
+            entries = {}
+            stored_at = datetime.utcnow().isoformat()
+            for company in companies:
+                website = company.get('website')
+                canonical = canonical_website(website) if website else None
+                names = [company.get('name', '')] + list(company.get('aliases') or [])
+                for name in names:
+                    key = self._normalize_company_name(name)
+                    if not key:
+                        continue
+                    entries[self._generate_id(key)] = (key, {
+                        "name": company.get('name', ''),
+                        "website": canonical,
+                        "last_updated": stored_at
+                    })
+
+            if not entries:
+                return False
+
+            documents, metadatas = [], []
+            for key, data in entries.values():
+                document, raw_bytes = encode_document(data)
+                documents.append(document)
+                metadatas.append({
+                    "key": key,
+                    "website": data['website'] or "",
+                    "stored_at": stored_at,
+                    "format_version": DOCUMENT_FORMAT_VERSION,
+                    "raw_bytes": raw_bytes
+                })
+            self.company_urls_collection.upsert(
+                ids=list(entries.keys()),
+                embeddings=self._placeholder_embeddings(self.company_urls_collection, len(entries)),
+                documents=documents,
+                metadatas=metadatas
+            )
+            return True
+        except Exception as e:
+            print(f"Error storing company URLs: {str(e)}")
+            return False
+
     async def get_competitor_data(self, competitor_identifier: str) -> Optional[Dict]:
         """Retrieve competitor data if it exists"""
+        document = await self.get_competitor_document(competitor_identifier)
+        return document[0] if document else None
+
+    def section_updated(self, data: Dict, metadata: Optional[Dict]) -> Dict[str, datetime]:
+        """
+        When each section of a stored profile was last generated. Profiles
+        stored before sections were tracked count as generated at once.
+        """
+        fallback = data.get('last_updated', '2000-01-01')
+        return {
+            section: datetime.fromisoformat((metadata or {}).get(f"updated_{section}") or fallback)
+            for section in PROFILE_SECTIONS
+        }
+
+    def section_expiry(self, data: Dict, metadata: Optional[Dict]) -> Dict[str, datetime]:
+        """
+        When each section of a stored profile goes stale. Every section of a
+        failed analysis placeholder expires PROFILE_REFRESH_RETRY_MINUTES
+        after it was stored, so that the analysis is retried as a whole.
+        """
+        if analysis_failed(data):
+            return {
+                section: updated + timedelta(minutes=PROFILE_REFRESH_RETRY_MINUTES)
+                for section, updated in self.section_updated(data, metadata).items()
+            }
+        return {
+            section: updated + timedelta(days=PROFILE_SECTION_TTL_DAYS[section])
+            for section, updated in self.section_updated(data, metadata).items()
+        }
+
+    def stale_sections(self, data: Dict, metadata: Optional[Dict], within: timedelta = timedelta(0)) -> List[str]:
+        """
+        Sections of a stored profile that are past their TTL, or will be
+        within `within`. None are while a failed refresh is backing off.
+        """
+        retry_at = (metadata or {}).get('refresh_retry_at')
+        if retry_at and datetime.utcnow() < datetime.fromisoformat(retry_at):
+            return []
+        now = datetime.utcnow() + within
+        return [section for section, expires_at in self.section_expiry(data, metadata).items() if now > expires_at]
+
+    @traced("db.get_competitor_document", "db")
+    async def get_competitor_document(
+        self,
+        competitor_identifier: str,
+        record_access: bool = True
+    ) -> Optional[Tuple[Dict, bytes, Dict]]:
+        """
+        Retrieve competitor data together with the stored JSON it was parsed
+        from and its metadata. Some sections may be stale; see stale_sections().
+        """
         try:
             doc_id = self._generate_id(competitor_identifier)
             
@@ -43,28 +400,47 @@ class DBManager:
                 return None
                 
             if result and result['documents']:
-                data = json.loads(result['documents'][0])
+                document, legacy = decode_document(result['documents'][0], result['metadatas'][0])
+                data = orjson.loads(document)
+                if legacy:
+                    self._migrate_document(self.competitors_collection, doc_id, data, result['metadatas'][0])
                 
-                # Check if data is older than 30 days
-                last_updated = datetime.fromisoformat(data.get('last_updated', '2000-01-01'))
-                days_old = (datetime.utcnow() - last_updated).days
-                
-                if days_old > 30:
+                # Sections expire one by one; drop the profile once all have
+                expires_at = list(self.section_expiry(data, result['metadatas'][0]).values())
+                if datetime.utcnow() > max(expires_at):
                     # Delete old data
                     self.competitors_collection.delete(ids=[doc_id])
+                    self.competitor_index_collection.delete(ids=[doc_id])
                     return None  # Return None to trigger fresh data collection
                     
-                return data
+                if record_access:
+                    self._record_access("competitor", competitor_identifier, min(expires_at))
+                return data, document, result['metadatas'][0] or {}
             return None
         except Exception as e:
             print(f"Error retrieving competitor data: {str(e)}")
             return None
 
-    async def store_competitor_data(self, competitor_data: Dict) -> bool:
-        """Store competitor analysis data"""
+    @traced("db.store_competitor_data", "db")
+    async def store_competitor_data(
+        self,
+        competitor_data: Dict,
+        llm_tokens: int = 0,
+        identifier: Optional[str] = None,
+        refreshed_sections: Optional[List[str]] = None,
+        previous_metadata: Optional[Dict] = None
+    ) -> bool:
+        """
+        Store competitor analysis data and the LLM tokens spent producing it.
+        Pass the identifier the competitor is looked up by if it differs from
+        the profile's website. After regenerating only some sections, pass
+        them as refreshed_sections along with the metadata the profile was
+        read with, so the other sections keep their timestamps.
+        """
         try:
             # Extract the identifier (website or name) from the nested structure
-            identifier = competitor_data.get('company_info', {}).get('website', '') or \
+            identifier = identifier or \
+                        competitor_data.get('company_info', {}).get('website', '') or \
                         competitor_data.get('company_info', {}).get('name', '')
             
             if not identifier:
@@ -74,35 +450,224 @@ class DBManager:
             
             # Add timestamp and prepare metadata
             data_to_store = self._add_timestamp(competitor_data.copy())
+            stored_at = datetime.utcnow().isoformat()
             metadata = {
                 "name": competitor_data.get('company_info', {}).get('name', ''),
                 "website": competitor_data.get('company_info', {}).get('website', ''),
-                "stored_at": datetime.utcnow().isoformat()
+                "stored_at": stored_at,
+                "llm_tokens": llm_tokens,
+                "analysis_failed": analysis_failed(competitor_data),
+                # Upserts merge metadata, so end any backoff from a failed refresh explicitly
+                "refresh_retry_at": stored_at
             }
+            for section in PROFILE_SECTIONS:
+                if refreshed_sections is None or section in refreshed_sections:
+                    metadata[f"updated_{section}"] = stored_at
+                else:
+                    metadata[f"updated_{section}"] = (previous_metadata or {}).get(f"updated_{section}") or \
+                        (previous_metadata or {}).get('stored_at', stored_at)
             
-            try:
-                # Check if document exists
-                self.competitors_collection.get(ids=[doc_id])
-                # Update existing data
-                self.competitors_collection.update(
-                    ids=[doc_id],
-                    documents=[json.dumps(data_to_store)],
-                    metadatas=[metadata]
-                )
-            except Exception:
-                # Store new data
-                self.competitors_collection.add(
-                    documents=[json.dumps(data_to_store)],
-                    metadatas=[metadata],
-                    ids=[doc_id]
-                )
+            document, raw_bytes = encode_document(data_to_store)
+            metadata.update(format_version=DOCUMENT_FORMAT_VERSION, raw_bytes=raw_bytes)
+
+            # Insert or replace; update() silently ignores IDs that don't exist yet
+            self.competitors_collection.upsert(
+                ids=[doc_id],
+                embeddings=self._placeholder_embeddings(self.competitors_collection, 1),
+                documents=[document],
+                metadatas=[metadata]
+            )
             return True
         except Exception as e:
             print(f"Error storing competitor data: {str(e)}")
             return False
 
+    @traced("db.postpone_competitor_refresh", "db")
+    async def postpone_competitor_refresh(self, identifier: str, metadata: Dict) -> bool:
+        """
+        Back off after a failed refresh of a stored profile, so its stale
+        sections are served as they are for PROFILE_REFRESH_RETRY_MINUTES
+        instead of every request trying again. Pass the metadata the profile
+        was read with.
+        """
+        try:
+            retry_at = datetime.utcnow() + timedelta(minutes=PROFILE_REFRESH_RETRY_MINUTES)
+            self.competitors_collection.update(
+                ids=[self._generate_id(identifier)],
+                metadatas=[{**metadata, "refresh_retry_at": retry_at.isoformat()}]
+            )
+            return True
+        except Exception as e:
+            print(f"Error postponing competitor refresh: {str(e)}")
+            return False
+
+    async def is_cached(self, query: str, competitor_identifiers: List[str]) -> bool:
+        """
+        Whether a query's search results and the given competitors' profiles
+        are all cached and fresh. Empty search results and placeholders of
+        failed analyses don't count. Only metadata is read, so this is cheap
+        enough to check before admitting a request. The reads run in a
+        thread so that they don't hold up the event loop (with a Chroma
+        server they are network round trips).
+        """
+        return await asyncio.to_thread(self._is_cached, query, competitor_identifiers)
+
+    def _is_cached(self, query: str, competitor_identifiers: List[str]) -> bool:
+        try:
+            search = self.search_results_collection.get(ids=[self._generate_id(query)], include=['metadatas'])
+            if not search['ids']:
+                return False
+            stored_at = datetime.fromisoformat(search['metadatas'][0].get('stored_at', '2000-01-01'))
+            if (datetime.utcnow() - stored_at).days > SEARCH_RESULTS_TTL_DAYS:
+                return False
+            if not search['metadatas'][0].get('result_count'):
+                return False
+
+            if not competitor_identifiers:
+                return True
+            doc_ids = list({self._generate_id(identifier) for identifier in competitor_identifiers})
+            competitors = self.competitors_collection.get(ids=doc_ids, include=['metadatas'])
+            return len(competitors['ids']) == len(doc_ids) and not any(
+                metadata.get('analysis_failed') or self.stale_sections({}, metadata)
+                for metadata in competitors['metadatas']
+            )
+        except Exception as e:
+            print(f"Error checking cached data: {str(e)}")
+            return False
+
+    async def get_competitor_batch(self, offset: int, limit: int) -> List[Tuple[str, Dict]]:
+        """Return (document ID, profile) pairs of stored competitors, a page at a time"""
+        try:
+            batch = self.competitors_collection.get(include=['documents'], limit=limit, offset=offset)
+            return [
+                (doc_id, orjson.loads(decode_document(document)[0]))
+                for doc_id, document in zip(batch['ids'], batch['documents'])
+            ]
+        except Exception as e:
+            print(f"Error listing competitor data: {str(e)}")
+            return []
+
+    async def get_indexed_summaries(self, doc_ids: List[str]) -> Dict[str, str]:
+        """Hashes of the summaries the given competitors were last embedded from"""
+        try:
+            result = self.competitor_index_collection.get(ids=doc_ids, include=['metadatas'])
+            return {
+                doc_id: metadata.get('summary_hash', '')
+                for doc_id, metadata in zip(result['ids'], result['metadatas'])
+            }
+        except Exception as e:
+            print(f"Error reading competitor index: {str(e)}")
+            return {}
+
+    def summary_hash(self, summary: str) -> str:
+        return hashlib.md5(summary.encode()).hexdigest()
+
+    @traced("db.store_competitor_embeddings", "db")
+    async def store_competitor_embeddings(self, entries: List[Dict]) -> bool:
+        """
+        Add or replace competitors in the similarity index. Each entry has
+        the competitor's document ID, its profile data, the summary that was
+        embedded and the embedding.
+        """
+        try:
+            if not entries:
+                return True
+            self.competitor_index_collection.upsert(
+                ids=[entry['id'] for entry in entries],
+                embeddings=[entry['embedding'] for entry in entries],
+                documents=[entry['summary'] for entry in entries],
+                metadatas=[
+                    {
+                        "name": entry['data'].get('company_info', {}).get('name', ''),
+                        "website": entry['data'].get('company_info', {}).get('website', ''),
+                        "industry": entry['data'].get('company_info', {}).get('industry') or '',
+                        # Normalized so that the industry filter isn't case sensitive
+                        "industry_key": (entry['data'].get('company_info', {}).get('industry') or '').strip().lower(),
+                        "summary_hash": self.summary_hash(entry['summary'])
+                    }
+                    for entry in entries
+                ]
+            )
+            return True
+        except Exception as e:
+            print(f"Error storing competitor embeddings: {str(e)}")
+            return False
+
+    async def remove_competitor_embeddings(self, doc_ids: List[str]) -> bool:
+        """Remove competitors from the similarity index by document ID"""
+        try:
+            self.competitor_index_collection.delete(ids=doc_ids)
+            return True
+        except Exception as e:
+            print(f"Error removing competitor embeddings: {str(e)}")
+            return False
+
+    async def get_competitor_embedding(self, competitor_identifier: str) -> Optional[Tuple[List[float], Dict]]:
+        """The indexed embedding of a competitor and its metadata, or None if it isn't indexed"""
+        try:
+            result = self.competitor_index_collection.get(
+                ids=[self._generate_id(competitor_identifier)],
+                include=['embeddings', 'metadatas']
+            )
+            if result['ids']:
+                return list(result['embeddings'][0]), result['metadatas'][0]
+            return None
+        except Exception as e:
+            print(f"Error reading competitor embedding: {str(e)}")
+            return None
+
+    @traced("db.query_similar_competitors", "db")
+    async def query_similar_competitors(
+        self,
+        embedding: List[float],
+        k: int,
+        industry: Optional[str] = None,
+        exclude_identifier: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Return the k indexed competitors nearest to an embedding, optionally
+        only those in an industry, with their cosine similarity. The
+        competitor searched from is excluded by its identifier.
+        """
+        try:
+            exclude_id = self._generate_id(exclude_identifier) if exclude_identifier else None
+            result = self.competitor_index_collection.query(
+                query_embeddings=[embedding],
+                n_results=k + (1 if exclude_id else 0),
+                where={"industry_key": industry.strip().lower()} if industry else None,
+                include=['metadatas', 'distances']
+            )
+            similar = [
+                {
+                    "name": metadata.get('name', ''),
+                    "website": metadata.get('website', ''),
+                    "industry": metadata.get('industry', ''),
+                    "similarity": 1 - distance
+                }
+                for doc_id, metadata, distance in zip(result['ids'][0], result['metadatas'][0], result['distances'][0])
+                if doc_id != exclude_id
+            ]
+            return similar[:k]
+        except Exception as e:
+            print(f"Error querying similar competitors: {str(e)}")
+            return []
+
     async def get_search_results(self, query: str) -> Optional[List[Dict]]:
         """Retrieve search results for a query if they exist"""
+        document = await self.get_search_results_document(query)
+        return document[0] if document else None
+
+    @traced("db.get_search_results_document", "db")
+    async def get_search_results_document(
+        self,
+        query: str,
+        num_results: Optional[int] = None
+    ) -> Optional[Tuple[List[Dict], bytes, Dict]]:
+        """
+        Retrieve search results together with the stored JSON they were
+        parsed from and its metadata. Pass the number of results the request
+        asked for, so that a prewarm refresh asks for as many.
+        """
         try:
             doc_id = self._generate_id(query)
             
@@ -115,25 +680,33 @@ class DBManager:
                 return None
                 
             if result and result['documents']:
-                data = json.loads(result['documents'][0])
+                document, legacy = decode_document(result['documents'][0], result['metadatas'][0])
+                data = orjson.loads(document)
+                if legacy:
+                    self._migrate_document(self.search_results_collection, doc_id, data, result['metadatas'][0])
                 
                 # Check if data is older than 7 days
                 last_updated = datetime.fromisoformat(data[0].get('last_updated', '2000-01-01'))
                 days_old = (datetime.utcnow() - last_updated).days
                 
-                if days_old > 7:
+                if days_old > SEARCH_RESULTS_TTL_DAYS:
                     # Delete old data
                     self.search_results_collection.delete(ids=[doc_id])
                     return None  # Return None to trigger fresh data collection
                     
-                return data
+                self._record_access(
+                    "search", query, last_updated + timedelta(days=SEARCH_RESULTS_TTL_DAYS),
+                    num_results=num_results or len(data)
+                )
+                return data, document, result['metadatas'][0] or {}
             return None
         except Exception as e:
             print(f"Error retrieving search results: {str(e)}")
             return None
 
-    async def store_search_results(self, query: str, results: List[Dict]) -> bool:
-        """Store search results"""
+    @traced("db.store_search_results", "db")
+    async def store_search_results(self, query: str, results: List[Dict], llm_tokens: int = 0) -> bool:
+        """Store search results and the LLM tokens spent analyzing them"""
         try:
             doc_id = self._generate_id(query)
             
@@ -142,30 +715,26 @@ class DBManager:
             metadata = {
                 "query": query,
                 "stored_at": datetime.utcnow().isoformat(),
-                "result_count": len(results)
+                "result_count": len(results),
+                "llm_tokens": llm_tokens
             }
             
-            try:
-                # Check if document exists
-                self.search_results_collection.get(ids=[doc_id])
-                # Update existing data
-                self.search_results_collection.update(
-                    ids=[doc_id],
-                    documents=[json.dumps(results_with_timestamp)],
-                    metadatas=[metadata]
-                )
-            except Exception:
-                # Store new results
-                self.search_results_collection.add(
-                    documents=[json.dumps(results_with_timestamp)],
-                    metadatas=[metadata],
-                    ids=[doc_id]
-                )
+            document, raw_bytes = encode_document(results_with_timestamp)
+            metadata.update(format_version=DOCUMENT_FORMAT_VERSION, raw_bytes=raw_bytes)
+
+            # Insert or replace; update() silently ignores IDs that don't exist yet
+            self.search_results_collection.upsert(
+                ids=[doc_id],
+                embeddings=self._placeholder_embeddings(self.search_results_collection, 1),
+                documents=[document],
+                metadatas=[metadata]
+            )
             return True
         except Exception as e:
             print(f"Error storing search results: {str(e)}")
             return False
 
+    @traced("db.clear_old_data", "db")
     async def clear_old_data(self) -> bool:
         """Clear data older than the retention period"""
         try:
@@ -173,21 +742,175 @@ class DBManager:
             competitors = self.competitors_collection.get()
             search_results = self.search_results_collection.get()
             
-            # Clear old competitor data (older than 30 days)
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+            # Clear competitor profiles whose sections have all gone stale
+            # (stored_at moves forward whenever any section is refreshed)
+            competitor_cutoff = datetime.utcnow() - timedelta(days=COMPETITOR_TTL_DAYS)
             for idx, metadata in enumerate(competitors.get('metadatas', [])):
                 stored_at = datetime.fromisoformat(metadata.get('stored_at', '2000-01-01'))
-                if stored_at < thirty_days_ago:
+                if stored_at < competitor_cutoff:
                     self.competitors_collection.delete(ids=[competitors['ids'][idx]])
+                    self.competitor_index_collection.delete(ids=[competitors['ids'][idx]])
             
             # Clear old search results (older than 7 days)
-            seven_days_ago = datetime.utcnow() - timedelta(days=7)
+            seven_days_ago = datetime.utcnow() - timedelta(days=SEARCH_RESULTS_TTL_DAYS)
             for idx, metadata in enumerate(search_results.get('metadatas', [])):
                 stored_at = datetime.fromisoformat(metadata.get('stored_at', '2000-01-01'))
                 if stored_at < seven_days_ago:
                     self.search_results_collection.delete(ids=[search_results['ids'][idx]])
+
+            # Clear expired company URL resolutions (negative entries expire sooner)
+            company_urls = self.company_urls_collection.get(include=['metadatas'])
+            for idx, metadata in enumerate(company_urls.get('metadatas', [])):
+                ttl_days = COMPANY_URL_TTL_DAYS if metadata.get('website') else COMPANY_URL_NEGATIVE_TTL_DAYS
+                stored_at = datetime.fromisoformat(metadata.get('stored_at', '2000-01-01'))
+                if stored_at < datetime.utcnow() - timedelta(days=ttl_days):
+                    self.company_urls_collection.delete(ids=[company_urls['ids'][idx]])
+
+            # Forget access stats of entries nobody has asked for in a while
+            access_cutoff = (datetime.utcnow() - timedelta(days=COMPETITOR_TTL_DAYS)).isoformat()
+            cache_access = self.cache_access_collection.get(include=['metadatas'])
+            stale_ids = [
+                cache_access['ids'][idx]
+                for idx, metadata in enumerate(cache_access.get('metadatas', []))
+                if metadata.get('last_access', '') < access_cutoff
+            ]
+            if stale_ids:
+                self.cache_access_collection.delete(ids=stale_ids)
             
             return True
         except Exception as e:
             print(f"Error clearing old data: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    @traced("db.get_storage_stats", "db")
+    async def get_storage_stats(self, batch_size: int = 1000) -> Dict[str, Dict[str, int]]:
+        """Report document counts and compressed vs. uncompressed sizes per collection"""
+        stats = {}
+        for name, collection in [
+            ("competitors", self.competitors_collection),
+            ("search_results", self.search_results_collection),
+            ("company_urls", self.company_urls_collection),
+        ]:
+            collection_stats = {"documents": 0, "legacy_documents": 0, "stored_bytes": 0, "raw_bytes": 0}
+            offset = 0
+            while True:
+                batch = collection.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+                if not batch['ids']:
+                    break
+                for document, metadata in zip(batch['documents'], batch['metadatas']):
+                    collection_stats["documents"] += 1
+                    collection_stats["stored_bytes"] += len(document)
+                    if (metadata or {}).get('raw_bytes') is not None:
+                        collection_stats["raw_bytes"] += metadata['raw_bytes']
+                    else:
+                        raw, legacy = decode_document(document, metadata)
+                        collection_stats["raw_bytes"] += len(raw)
+                        collection_stats["legacy_documents"] += int(legacy)
+                offset += len(batch['ids'])
+            collection_stats["bytes_saved"] = collection_stats["raw_bytes"] - collection_stats["stored_bytes"]
+            stats[name] = collection_stats
+        return stats
+
+    def _record_access(self, kind: str, key: str, expires_at: datetime, hits: int = 1, **extra) -> None:
+        """Count an access to a cached entry (kept in memory until flushed)"""
+        if not self.track_access:
+            return
+        doc_id = self._generate_id(f"{kind}:{key}")
+        pending = self._pending_access.setdefault(doc_id, {"kind": kind, "key": key, "hits": 0})
+        pending["hits"] += hits
+        pending["last_access"] = datetime.utcnow().isoformat()
+        pending["expires_at"] = expires_at.isoformat()
+        pending.update(extra)
+        if len(self._pending_access) >= self.max_pending_access:
+            self._flush_pending_access()
+
+    async def record_refresh(self, kind: str, key: str) -> None:
+        """Note that an entry was regenerated, moving its expiry forward"""
+        if kind == "competitor":
+            # Only some sections may have been regenerated; the profile
+            # expires again when the first of its sections goes stale
+            cached = await self.get_competitor_document(key, record_access=False)
+            if cached is None:
+                return
+            expires_at = min(self.section_expiry(cached[0], cached[2]).values())
+        else:
+            expires_at = datetime.utcnow() + timedelta(days=SEARCH_RESULTS_TTL_DAYS)
+        self._record_access(kind, key, expires_at, hits=0)
+
+    @traced("db.flush_access_stats", "db")
+    async def flush_access_stats(self) -> bool:
+        """Merge in-memory access counts into the cache_access collection"""
+        return self._flush_pending_access()
+
+    def _flush_pending_access(self) -> bool:
+        pending, self._pending_access = self._pending_access, {}
+        if not pending:
+            return True
+        try:
+            ids = list(pending.keys())
+            existing = self.cache_access_collection.get(ids=ids, include=['metadatas'])
+            previous = dict(zip(existing['ids'], existing['metadatas']))
+
+            metadatas = []
+            for doc_id in ids:
+                metadata = dict(previous.get(doc_id) or {})
+                update = pending[doc_id]
+                hits = self._decayed_hits(metadata, datetime.fromisoformat(update["last_access"]))
+                metadata.update({k: v for k, v in update.items() if k != "hits"})
+                metadata["hits"] = hits + update["hits"]
+                metadatas.append(metadata)
+
+            self.cache_access_collection.upsert(
+                ids=ids,
+                embeddings=self._placeholder_embeddings(self.cache_access_collection, len(ids)),
+                documents=[m["key"] for m in metadatas],
+                metadatas=metadatas
+            )
+            return True
+        except Exception as e:
+            print(f"Error flushing cache access stats: {str(e)}")
+            return False
+
+    def _decayed_hits(self, metadata: Dict, at: datetime) -> float:
+        """An entry's hit count (as of its last access), decayed to `at`"""
+        last_access = metadata.get('last_access')
+        if not last_access:
+            return metadata.get('hits', 0)
+        age = max(at - datetime.fromisoformat(last_access), timedelta(0))
+        return metadata.get('hits', 0) * 0.5 ** (age / self.access_half_life)
+
+    @traced("db.get_prewarm_candidates", "db")
+    async def get_prewarm_candidates(
+        self,
+        limit: int,
+        expiring_within: timedelta,
+        accessed_within: timedelta = timedelta(days=SEARCH_RESULTS_TTL_DAYS),
+        batch_size: int = 1000
+    ) -> List[Dict]:
+        """
+        Return the most frequently accessed entries that expire within
+        `expiring_within` and were used within `accessed_within`, hottest
+        (by recency-weighted hits) first.
+        """
+        try:
+            now = datetime.utcnow()
+            expiry_cutoff = (now + expiring_within).isoformat()
+            access_cutoff = (now - accessed_within).isoformat()
+
+            candidates = []
+            offset = 0
+            while True:
+                batch = self.cache_access_collection.get(include=['metadatas'], limit=batch_size, offset=offset)
+                if not batch['ids']:
+                    break
+                for metadata in batch['metadatas']:
+                    # ISO timestamps compare correctly as strings
+                    if metadata.get('expires_at', '') <= expiry_cutoff and metadata.get('last_access', '') >= access_cutoff:
+                        candidates.append(metadata)
+                offset += len(batch['ids'])
+
+            candidates.sort(key=lambda m: self._decayed_hits(m, now), reverse=True)
+            return candidates[:limit]
+        except Exception as e:
+            print(f"Error retrieving prewarm candidates: {str(e)}")
+            return []
@@ -0,0 +1,87 @@
+"""
+Per-request latency budgets.
+
+collect_data_json starts a Deadline for requests that set
+latency_budget_ms. Stages of the request run through Deadline.run(), which
+cancels them when the budget runs out, and every HTTP session and LLM call
+made while handling the request takes its timeout from the time remaining.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+import aiohttp
+from aiohttp.client import DEFAULT_TIMEOUT
+
+T = TypeVar("T")
+
+# HTTP timeouts fire a little after the deadline itself, so an in-flight
+# request is cancelled along with its stage instead of failing on its own
+# and being mistaken for an upstream error
+_HTTP_GRACE_SECONDS = 0.5
+
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """The request's latency budget ran out before this step finished"""
+
+class Deadline:
+    def __init__(self, budget_seconds: Optional[float] = None):
+        self.expires_at = time.monotonic() + budget_seconds if budget_seconds else None
+
+    @classmethod
+    def from_ms(cls, budget_ms: Optional[int]) -> "Deadline":
+        return cls(budget_ms / 1000 if budget_ms else None)
+
+    def __enter__(self) -> "Deadline":
+        self._token = _current_deadline.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _current_deadline.reset(self._token)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None if there is no deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """
+        Await a stage, cancelling it and raising DeadlineExceeded if the
+        budget runs out. Timeouts raised by the stage itself (e.g. an HTTP
+        request timing out) are passed on as they are.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        if remaining <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded()
+        timeout = asyncio.timeout(remaining)
+        try:
+            async with timeout:
+                return await awaitable
+        except TimeoutError:
+            if timeout.expired():
+                raise DeadlineExceeded()
+            raise
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+def time_remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None without one"""
+    deadline = current_deadline()
+    return deadline.remaining() if deadline else None
+
+def http_timeout() -> aiohttp.ClientTimeout:
+    """Timeout for a new ClientSession: the remaining budget, or aiohttp's default"""
+    remaining = time_remaining()
+    if remaining is None:
+        return DEFAULT_TIMEOUT
+    return aiohttp.ClientTimeout(total=remaining + _HTTP_GRACE_SECONDS)
@@ -0,0 +1,104 @@
+"""
+Near-duplicate detection for search results.
+
+Google often returns the same page under several URLs, or several pages of
+one site with nearly the same snippet. group_near_duplicates() assigns each
+result to a representative so that only representatives are sent to the LLM
+and their analysis is reused for the rest of the group.
+
+Two results are grouped when they have the same canonical URL, when their
+title and snippet are near-identical (MinHash estimate of the Jaccard
+similarity of their word shingles), or when they come from the same domain
+and their snippets are merely similar.
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+import mmh3
+from .telemetry import meter
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+
+# Estimated Jaccard similarity above which results are duplicates
+CONTENT_THRESHOLD = 0.8
+SAME_DOMAIN_THRESHOLD = 0.6
+
+# Query parameters that don't change the page (plus any utm_* parameter)
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "source"}
+
+_duplicates_skipped = meter.create_counter(
+    "search.duplicates_skipped",
+    description="Search results whose LLM analysis was reused from a near-duplicate result"
+)
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so that trivially different links to a page compare equal"""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = re.sub(r"/+$", "", parsed.path) or "/"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parsed.query)
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ))
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
+def _domain(url: str) -> str:
+    return canonical_url(url).split("/", 1)[0]
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Word n-grams of the normalized text (the whole text if it is shorter)"""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def minhash(items: set, num_permutations: int = NUM_PERMUTATIONS) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of a set of shingles, or None for an empty set"""
+    if not items:
+        return None
+    return tuple(
+        min(mmh3.hash(item, seed, signed=False) for item in items)
+        for seed in range(num_permutations)
+    )
+
+def similarity(a: Optional[Tuple[int, ...]], b: Optional[Tuple[int, ...]]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures"""
+    if a is None or b is None:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+def group_near_duplicates(
+    items: Sequence[Dict],
+    content_threshold: float = CONTENT_THRESHOLD,
+    same_domain_threshold: float = SAME_DOMAIN_THRESHOLD
+) -> List[int]:
+    """
+    For Google result items (dicts with 'link', 'title' and 'snippet') return,
+    for each item, the index of the item that represents its group. The
+    first item of a group is its representative.
+    """
+    representatives: List[int] = []
+    urls = [canonical_url(item.get('link', '')) for item in items]
+    domains = [_domain(item.get('link', '')) for item in items]
+    content = [minhash(shingles(f"{item.get('title', '')} {item.get('snippet', '')}")) for item in items]
+    snippets = [minhash(shingles(item.get('snippet', ''))) for item in items]
+
+    for i in range(len(items)):
+        representative = i
+        for j in sorted(set(representatives)):
+            if (
+                urls[i] == urls[j]
+                or similarity(content[i], content[j]) >= content_threshold
+                or (domains[i] == domains[j] and similarity(snippets[i], snippets[j]) >= same_domain_threshold)
+            ):
+                representative = j
+                break
+        representatives.append(representative)
+    return representatives
+
+def record_duplicates_skipped(count: int) -> None:
+    if count:
+        _duplicates_skipped.add(count)
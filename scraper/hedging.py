@@ -0,0 +1,118 @@
+"""
+Hedged LLM requests.
+
+A call that hasn't returned after the hedge delay is duplicated; whichever
+attempt answers first wins and the other is cancelled. The delay is a
+percentile of the recent latencies of the same operation, so only the slow
+tail gets hedged, and a cap on the share of hedged calls bounds the extra
+cost.
+
+Configured through environment variables:
+    LLM_HEDGE_ENABLED      "1" to hedge chat completions (default off)
+    LLM_HEDGE_PERCENTILE   latency percentile used as the hedge delay (default 95)
+    LLM_HEDGE_MAX_RATE     largest share of recent calls that may be hedged (default 0.05)
+    LLM_HEDGE_MIN_SAMPLES  latencies needed before an operation is hedged (default 20)
+    LLM_HEDGE_WINDOW       recent calls per operation the delay and rate are based on (default 200)
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+from .telemetry import meter
+
+T = TypeVar("T")
+
+_hedges = meter.create_counter(
+    "llm.hedges",
+    description="LLM calls that were hedged, by operation and winning attempt (primary or hedge)"
+)
+_hedges_suppressed = meter.create_counter(
+    "llm.hedges_suppressed",
+    description="LLM calls past the hedge delay that weren't hedged because of the rate cap, by operation"
+)
+
+class _OperationStats:
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.hedged: Deque[bool] = deque(maxlen=window)
+
+class Hedger:
+    def __init__(self, enabled: bool = False, percentile: float = 95, max_rate: float = 0.05,
+                 min_samples: int = 20, window: int = 200):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.window = window
+        self._stats: Dict[str, _OperationStats] = {}
+
+    @classmethod
+    def from_env(cls) -> "Hedger":
+        return cls(
+            enabled=os.getenv("LLM_HEDGE_ENABLED") == "1",
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            max_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", "0.05")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            window=int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+        )
+
+    def _operation(self, operation: str) -> _OperationStats:
+        stats = self._stats.get(operation)
+        if stats is None:
+            stats = self._stats[operation] = _OperationStats(self.window)
+        return stats
+
+    def delay(self, operation: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies are known"""
+        latencies = self._operation(operation).latencies
+        if len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def _may_hedge(self, stats: _OperationStats) -> bool:
+        return sum(stats.hedged) < self.max_rate * max(len(stats.hedged), 1)
+
+    async def run(self, operation: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call`, starting a second attempt if the first one is slow"""
+        if not self.enabled:
+            return await call()
+
+        stats = self._operation(operation)
+        delay = self.delay(operation)
+        attempts: Dict[asyncio.Task, float] = {}
+
+        def start() -> asyncio.Task:
+            task = asyncio.ensure_future(call())
+            attempts[task] = time.perf_counter()
+            return task
+
+        primary = start()
+        hedged = False
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done:
+                if self._may_hedge(stats):
+                    hedged = True
+                    start()
+                else:
+                    _hedges_suppressed.add(1, {"operation": operation})
+
+            # First successful attempt wins; if one fails, wait for the other
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    if task.exception() is None or not pending:
+                        # Fast failures would pull the hedge delay down
+                        if task.exception() is None:
+                            stats.latencies.append(time.perf_counter() - attempts[task])
+                        if hedged:
+                            _hedges.add(1, {"operation": operation, "winner": "primary" if task is primary else "hedge"})
+                        return task.result()
+        finally:
+            stats.hedged.append(hedged)
+            for task in attempts:
+                task.cancel()
@@ -0,0 +1,109 @@
+"""
+Background refresh of popular cache entries before they expire.
+
+While prewarming is enabled, DBManager counts hits per cached query and
+competitor, flushing them itself if too many pile up. Older hits count for
+less, so current favourites win over entries that were popular long ago.
+Every interval the prewarmer flushes those counts, picks the most popular
+entries that expire within the lookahead window and regenerates them,
+stopping once the LLM token budget for the run is spent. When several workers share the cache,
+only one of them runs the refreshes.
+
+Configured through environment variables:
+    CACHE_PREWARM_ENABLED           "1" to run the scheduler (default off)
+    CACHE_PREWARM_INTERVAL_SECONDS  time between runs (default 3600)
+    CACHE_PREWARM_TOP_N             entries considered per run (default 20)
+    CACHE_PREWARM_WINDOW_HOURS      refresh entries expiring within this window (default 24)
+    CACHE_PREWARM_TOKEN_BUDGET      LLM tokens a run may spend (default 50000)
+    ACCESS_STATS_MAX_PENDING        distinct entries counted in memory before a flush (default 10000)
+    ACCESS_STATS_HALF_LIFE_DAYS     days over which an entry's hit count halves (default 7)
+"""
+import asyncio
+import os
+from datetime import timedelta
+from typing import Dict
+from .telemetry import meter, span
+from .usage import UsageTracker
+
+_refreshes = meter.create_counter(
+    "cache.prewarm.refreshes",
+    description="Cache entries refreshed ahead of expiry, by kind"
+)
+
+class CachePrewarmer:
+    def __init__(self, collector, interval_seconds: float = 3600, top_n: int = 20,
+                 window: timedelta = timedelta(hours=24), token_budget: int = 50000):
+        self.collector = collector
+        self.db_manager = collector.db_manager
+        self.interval_seconds = interval_seconds
+        self.top_n = top_n
+        self.window = window
+        self.token_budget = token_budget
+        self._task = None
+
+    @classmethod
+    def from_env(cls, collector) -> "CachePrewarmer":
+        return cls(
+            collector,
+            interval_seconds=float(os.getenv("CACHE_PREWARM_INTERVAL_SECONDS", "3600")),
+            top_n=int(os.getenv("CACHE_PREWARM_TOP_N", "20")),
+            window=timedelta(hours=float(os.getenv("CACHE_PREWARM_WINDOW_HOURS", "24"))),
+            token_budget=int(os.getenv("CACHE_PREWARM_TOKEN_BUDGET", "50000"))
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.db_manager.flush_access_stats()
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                # With several workers, only one of them refreshes; the others
+                # just flush the hit counts they collected
+                if self.collector.coordinator.leader("prewarm"):
+                    await self.run_once()
+                else:
+                    await self.db_manager.flush_access_stats()
+            except Exception as e:
+                print(f"Error prewarming cache: {str(e)}")
+
+    async def run_once(self) -> Dict[str, int]:
+        """Refresh the hottest entries that are about to expire, within the token budget"""
+        summary = {"candidates": 0, "refreshed": 0, "tokens": 0}
+        with span("prewarm.run", "prewarm"):
+            await self.db_manager.flush_access_stats()
+            candidates = await self.db_manager.get_prewarm_candidates(self.top_n, self.window)
+            summary["candidates"] = len(candidates)
+
+            with UsageTracker() as usage:
+                for candidate in candidates:
+                    if usage.total_tokens() >= self.token_budget:
+                        break
+                    kind, key = candidate["kind"], candidate["key"]
+                    if kind == "search":
+                        await self.collector.refresh_search_results(key, int(candidate.get("num_results", 10)))
+                    else:
+                        # Only the sections that expire soon are regenerated
+                        cached = await self.db_manager.get_competitor_document(key, record_access=False)
+                        await self.collector.refresh_competitor(key, cached, within=self.window)
+                    await self.db_manager.record_refresh(kind, key)
+                    _refreshes.add(1, {"kind": kind})
+                    summary["refreshed"] += 1
+            summary["tokens"] = usage.total_tokens()
+
+        print(
+            f"Prewarmed {summary['refreshed']}/{summary['candidates']} cache entries "
+            f"using {summary['tokens']} LLM tokens"
+        )
+        return summary
@@ -0,0 +1,279 @@
+"""
+On-demand profiling of single requests.
+
+A /search request that carries the X-Profile header with the token in
+PROFILING_TOKEN is profiled: a sampling thread records the event loop
+thread's stack at a fixed interval, and the spans of the request's trace
+give a wall-clock breakdown by stage. The profile is saved under
+PROFILING_DIR and served by /profiles/{id}, either as JSON or as collapsed
+stacks for flamegraph.pl or speedscope.
+
+Samples are attributed to the profiled request when the task running on
+the event loop is the request's or one it started. Samples taken while
+other requests' tasks run, or while the loop is between tasks (waiting on
+I/O or running callbacks), are kept under "<other tasks>" and "<no task>"
+so that the profile accounts for all of the request's wall time. This
+relies on a private detail of CPython's asyncio; where it isn't available
+all samples of the event loop thread are kept, without attribution.
+
+Nothing is installed until the first profiled request, so requests
+without the header run exactly as before.
+
+Configured through environment variables:
+    PROFILING_TOKEN          token expected in X-Profile; profiling is off when unset
+    PROFILING_INTERVAL_MS    sampling interval (default 5)
+    PROFILING_DIR            where profiles are saved (default ./data/profiles)
+    PROFILING_MAX_PROFILES   profiles kept, newest first (default 100)
+    PROFILING_MAX_AGE_HOURS  profiles older than this are removed (default 168)
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+import orjson
+from opentelemetry import trace
+from opentelemetry.sdk.trace import SpanProcessor
+
+try:
+    # The dict asyncio keeps of the task each loop is running. Some versions
+    # don't have it, or keep it but no longer update it; see RequestProfile.
+    from asyncio.tasks import _current_tasks
+except ImportError:
+    _current_tasks = None
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+def profiling_token() -> Optional[str]:
+    return os.getenv("PROFILING_TOKEN") or None
+
+def authorized(token: str) -> bool:
+    """Whether a token from the X-Profile header may profile requests"""
+    expected = profiling_token()
+    return bool(expected) and hmac.compare_digest(token.encode(), expected.encode())
+
+def profiles_dir() -> str:
+    return os.getenv("PROFILING_DIR", "./data/profiles")
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _stack(frame) -> List[str]:
+    """Function names of a stack, outermost first"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+class _ProfileSpanProcessor(SpanProcessor):
+    """Hands finished spans to the profile of the trace they belong to"""
+
+    def __init__(self):
+        self.profiles: Dict[int, "RequestProfile"] = {}
+
+    def on_end(self, span) -> None:
+        profile = self.profiles.get(span.context.trace_id)
+        if profile is not None:
+            profile.spans.append(span)
+
+_span_processor: Optional[_ProfileSpanProcessor] = None
+
+class _TaskTracker:
+    """
+    Task factory, installed while any request is being profiled, that adds
+    tasks started by a profiled request to its profile
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.previous = loop.get_task_factory()
+        self.users = 0
+
+    def __call__(self, loop, coro, **kwargs):
+        if self.previous is not None:
+            task = self.previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        profile = _active_profile.get()
+        if profile is not None:
+            profile.tasks.add(task)
+        return task
+
+_trackers: Dict[asyncio.AbstractEventLoop, _TaskTracker] = {}
+
+class RequestProfile:
+    def __init__(self, label: str, interval: float):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.interval = interval
+        self.tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+        self.spans: List = []
+        self.stacks: Counter = Counter()
+        self.started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        self._end: Optional[float] = None
+        self._stop = threading.Event()
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        # Whether samples can be attributed to the task running at the time
+        self._attributed = _current_tasks is not None and \
+            _current_tasks.get(self._loop) is asyncio.current_task()
+        self._trace_id = trace.get_current_span().get_span_context().trace_id
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{self.id[:8]}", daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = _stack(frame)
+            if self._attributed:
+                running = _current_tasks.get(self._loop)
+                if running is None:
+                    stack.insert(0, "<no task>")
+                elif running not in self.tasks:
+                    stack.insert(0, "<other tasks>")
+            self.stacks[";".join(stack)] += 1
+
+    def start(self) -> None:
+        global _span_processor
+        if _span_processor is None:
+            _span_processor = _ProfileSpanProcessor()
+            trace.get_tracer_provider().add_span_processor(_span_processor)
+        if self._trace_id:
+            _span_processor.profiles[self._trace_id] = self
+
+        tracker = _trackers.get(self._loop)
+        if tracker is None:
+            tracker = _trackers[self._loop] = _TaskTracker(self._loop)
+            self._loop.set_task_factory(tracker)
+        tracker.users += 1
+
+        self.tasks.add(asyncio.current_task())
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._end = time.perf_counter()
+        self._stop.set()
+        self._sampler.join()
+        _span_processor.profiles.pop(self._trace_id, None)
+
+        tracker = _trackers[self._loop]
+        tracker.users -= 1
+        if tracker.users == 0:
+            self._loop.set_task_factory(tracker.previous)
+            del _trackers[self._loop]
+
+    def breakdown(self) -> Dict[str, Dict]:
+        """
+        Wall time by stage. Spans of a stage can overlap (e.g. concurrent LLM
+        calls), so a stage's total may exceed the request's duration.
+        """
+        stages: Dict[str, Dict] = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.attributes.get("stage", "other"), {"count": 0, "total_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += (span.end_time - span.start_time) / 1e6
+        return stages
+
+    def to_dict(self) -> Dict:
+        request_start = min((span.start_time for span in self.spans), default=0)
+        samples = sum(self.stacks.values())
+        return {
+            "id": self.id,
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": ((self._end or time.perf_counter()) - self._start) * 1000,
+            "interval_ms": self.interval * 1000,
+            "samples": {
+                "total": samples,
+                "attributed": self._attributed,
+                "other_tasks": sum(n for stack, n in self.stacks.items() if stack.startswith("<other tasks>")),
+                "no_task": sum(n for stack, n in self.stacks.items() if stack.startswith("<no task>"))
+            },
+            "stages": self.breakdown(),
+            "spans": sorted(
+                (
+                    {
+                        "name": span.name,
+                        "stage": span.attributes.get("stage", "other"),
+                        "start_ms": (span.start_time - request_start) / 1e6,
+                        "duration_ms": (span.end_time - span.start_time) / 1e6
+                    }
+                    for span in self.spans
+                ),
+                key=lambda s: s["start_ms"]
+            ),
+            "stacks": dict(self.stacks.most_common())
+        }
+
+    def save(self) -> str:
+        """Write the profile to PROFILING_DIR, removing profiles past the retention limits"""
+        os.makedirs(profiles_dir(), exist_ok=True)
+        path = os.path.join(profiles_dir(), f"{self.id}.json")
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(self.to_dict()))
+        prune_profiles()
+        return path
+
+def prune_profiles() -> int:
+    """Remove saved profiles beyond PROFILING_MAX_PROFILES or older than PROFILING_MAX_AGE_HOURS"""
+    max_profiles = int(os.getenv("PROFILING_MAX_PROFILES", "100"))
+    oldest = time.time() - float(os.getenv("PROFILING_MAX_AGE_HOURS", "168")) * 3600
+    with os.scandir(profiles_dir()) as entries:
+        saved = sorted(
+            (entry for entry in entries if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+    removed = 0
+    for index, entry in enumerate(saved):
+        if index >= max_profiles or entry.stat().st_mtime < oldest:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass  # removed by another worker
+    return removed
+
+@asynccontextmanager
+async def profile_request(label: str) -> AsyncIterator[RequestProfile]:
+    """Profile the current task and the tasks it starts, saving the profile on exit"""
+    profile = RequestProfile(label, float(os.getenv("PROFILING_INTERVAL_MS", "5")) / 1000)
+    token = _active_profile.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _active_profile.reset(token)
+        try:
+            # Off the event loop, which other requests are using
+            await asyncio.to_thread(profile.save)
+        except OSError as e:
+            print(f"Error saving profile: {str(e)}")
+
+def load_profile(profile_id: str) -> Optional[Dict]:
+    """Read a saved profile, or None if there is none with this ID"""
+    if not profile_id.isalnum():
+        return None
+    try:
+        with open(os.path.join(profiles_dir(), f"{profile_id}.json"), "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+def collapsed_stacks(profile: Dict) -> str:
+    """A profile's samples in the collapsed stack format of flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
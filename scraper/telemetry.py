@@ -0,0 +1,206 @@
+"""
+Tracing and metrics for the request pipeline.
+
+Spans are exported according to OTEL_TRACES_EXPORTER:
+    none     (default) spans are recorded but not exported
+    console  print spans to stdout
+    file     append spans as JSON lines to OTEL_TRACES_FILE (./traces.jsonl)
+    otlp     send spans to an OTLP collector (OTEL_EXPORTER_OTLP_ENDPOINT)
+
+Metrics are kept in memory and rendered in the Prometheus text format by
+render_metrics(), which main.py serves on /metrics.
+"""
+import functools
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Iterator, Sequence
+import aiohttp
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import Histogram, InMemoryMetricReader, Sum
+from opentelemetry.sdk.metrics.view import View, ExplicitBucketHistogramAggregation
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+)
+
+SERVICE_NAME = "google-search-analyzer"
+
+# Latency buckets in seconds, from cache lookups up to slow LLM calls
+_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Append finished spans to a local file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans) -> SpanExportResult:
+        try:
+            with open(self.path, "a") as f:
+                for span in spans:
+                    f.write(span.to_json(indent=None) + "\n")
+            return SpanExportResult.SUCCESS
+        except OSError as e:
+            print(f"Error exporting spans: {str(e)}")
+            return SpanExportResult.FAILURE
+
+def _create_span_exporter():
+    exporter = os.getenv("OTEL_TRACES_EXPORTER", "none").lower()
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    if exporter == "file":
+        return JsonLinesSpanExporter(os.getenv("OTEL_TRACES_FILE", "./traces.jsonl"))
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    return None
+
+_resource = Resource.create({"service.name": SERVICE_NAME})
+
+_tracer_provider = TracerProvider(resource=_resource)
+_span_exporter = _create_span_exporter()
+if _span_exporter:
+    _tracer_provider.add_span_processor(BatchSpanProcessor(_span_exporter))
+trace.set_tracer_provider(_tracer_provider)
+
+_metric_reader = InMemoryMetricReader()
+metrics.set_meter_provider(MeterProvider(
+    resource=_resource,
+    metric_readers=[_metric_reader],
+    views=[View(
+        instrument_name="pipeline.duration",
+        aggregation=ExplicitBucketHistogramAggregation(_LATENCY_BUCKETS)
+    )]
+))
+
+tracer = trace.get_tracer("scraper")
+meter = metrics.get_meter("scraper")
+
+_stage_duration = meter.create_histogram(
+    "pipeline.duration",
+    unit="s",
+    description="Latency of pipeline operations by stage (request, llm, http, db)"
+)
+_in_flight = meter.create_up_down_counter(
+    "pipeline.in_flight",
+    description="Operations currently in progress by stage (request, llm, db)"
+)
+_cache_lookups = meter.create_counter(
+    "cache.lookups",
+    description="Cache lookups by cache and result (hit or miss)"
+)
+
+@contextmanager
+def span(name: str, stage: str, **attributes) -> Iterator[trace.Span]:
+    """
+    Trace a block of work and record its latency and in-flight count under
+    the given stage.
+    """
+    labels = {"stage": stage, "operation": name}
+    _in_flight.add(1, {"stage": stage})
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(name, attributes={"stage": stage, **attributes}) as current:
+            yield current
+    finally:
+        _stage_duration.record(time.perf_counter() - start, labels)
+        _in_flight.add(-1, {"stage": stage})
+
+def traced(name: str, stage: str):
+    """Decorator form of span() for async functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """
+    aiohttp tracing hooks that record every outgoing request as an "http"
+    stage span. Pass to ClientSession(trace_configs=[...]).
+
+    No hook runs when a request is cancelled (e.g. by a request deadline),
+    so HTTP requests aren't counted in pipeline.in_flight, which would
+    never be decremented for them.
+    """
+    async def on_request_start(session, context: SimpleNamespace, params) -> None:
+        name = f"http.{params.method} {params.url.host}"
+        context.span = tracer.start_span(name, attributes={
+            "stage": "http",
+            "http.method": params.method,
+            "http.url": str(params.url.with_query(None))
+        })
+        context.start = time.perf_counter()
+        context.name = name
+
+    def finish(context: SimpleNamespace) -> None:
+        context.span.end()
+        _stage_duration.record(time.perf_counter() - context.start, {"stage": "http", "operation": context.name})
+
+    async def on_request_end(session, context: SimpleNamespace, params) -> None:
+        context.span.set_attribute("http.status_code", params.response.status)
+        finish(context)
+
+    async def on_request_exception(session, context: SimpleNamespace, params) -> None:
+        context.span.record_exception(params.exception)
+        context.span.set_status(trace.Status(trace.StatusCode.ERROR))
+        finish(context)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a cache hit or miss"""
+    _cache_lookups.add(1, {"cache": cache, "result": "hit" if hit else "miss"})
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+def _format_labels(attributes: Dict, extra: Sequence = ()) -> str:
+    items = [(_metric_name(str(k)), v) for k, v in attributes.items()] + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def render_metrics() -> str:
+    """Render all recorded metrics in the Prometheus text exposition format"""
+    lines = []
+    data = _metric_reader.get_metrics_data()
+    for resource_metrics in (data.resource_metrics if data else []):
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                name = _metric_name(metric.name)
+                points = metric.data.data_points
+                if isinstance(metric.data, Histogram):
+                    lines.append(f"# HELP {name} {metric.description}")
+                    lines.append(f"# TYPE {name} histogram")
+                    for point in points:
+                        cumulative = 0
+                        bounds = list(point.explicit_bounds) + [float("inf")]
+                        for bound, count in zip(bounds, point.bucket_counts):
+                            cumulative += count
+                            le = "+Inf" if bound == float("inf") else repr(float(bound))
+                            lines.append(f"{name}_bucket{_format_labels(point.attributes, [('le', le)])} {cumulative}")
+                        lines.append(f"{name}_sum{_format_labels(point.attributes)} {point.sum}")
+                        lines.append(f"{name}_count{_format_labels(point.attributes)} {point.count}")
+                elif isinstance(metric.data, Sum) and metric.data.is_monotonic:
+                    lines.append(f"# HELP {name}_total {metric.description}")
+                    lines.append(f"# TYPE {name}_total counter")
+                    for point in points:
+                        lines.append(f"{name}_total{_format_labels(point.attributes)} {point.value}")
+                else:
+                    lines.append(f"# HELP {name} {metric.description}")
+                    lines.append(f"# TYPE {name} gauge")
+                    for point in points:
+                        lines.append(f"{name}{_format_labels(point.attributes)} {point.value}")
+    return "\n".join(lines) + "\n"
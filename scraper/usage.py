@@ -0,0 +1,85 @@
+"""
+Per-request accounting of OpenAI token usage.
+
+collect_data_json starts a UsageTracker for the request; every chat
+completion made while handling it is recorded against its stage. Running
+totals across all requests are exported as metrics.
+"""
+from contextvars import ContextVar
+from typing import Optional
+from models.response import Diagnostics, TokenUsage
+from .telemetry import meter
+
+_llm_tokens = meter.create_counter(
+    "llm.tokens",
+    description="OpenAI tokens used by stage and type (prompt, completion, cached)"
+)
+_llm_calls = meter.create_counter(
+    "llm.calls",
+    description="OpenAI chat completion and embeddings calls by stage"
+)
+_tokens_saved = meter.create_counter(
+    "cache.tokens_saved",
+    description="LLM tokens not spent because a cached result was served, by cache"
+)
+
+_current_tracker: ContextVar[Optional["UsageTracker"]] = ContextVar("usage_tracker", default=None)
+
+class UsageTracker:
+    """
+    Collects token usage for a single request. Trackers nest: usage recorded
+    in an inner tracker (e.g. one stage of a request) also counts towards the
+    enclosing one.
+    """
+
+    def __init__(self):
+        self.diagnostics = Diagnostics()
+        self.parent: Optional["UsageTracker"] = None
+
+    def __enter__(self) -> "UsageTracker":
+        self.parent = _current_tracker.get()
+        self._token = _current_tracker.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _current_tracker.reset(self._token)
+
+    def total_tokens(self) -> int:
+        return self.diagnostics.total_usage.total_tokens
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> None:
+        stage_usage = self.diagnostics.token_usage.setdefault(stage, TokenUsage())
+        for usage in (stage_usage, self.diagnostics.total_usage):
+            usage.calls += 1
+            usage.prompt_tokens += prompt_tokens
+            usage.completion_tokens += completion_tokens
+            usage.cached_tokens += cached_tokens
+            usage.total_tokens += prompt_tokens + completion_tokens
+        if self.parent:
+            self.parent.add(stage, prompt_tokens, completion_tokens, cached_tokens)
+
+    def add_saved(self, cache: str, tokens: int) -> None:
+        self.diagnostics.tokens_saved_by_cache += tokens
+        _tokens_saved.add(tokens, {"cache": cache})
+
+def current_tracker() -> Optional[UsageTracker]:
+    return _current_tracker.get()
+
+def record_llm_usage(stage: str, usage) -> None:
+    """Record the usage block of a chat completion or embeddings response"""
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_tokens or 0
+    # Embeddings responses have no completion tokens
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    _llm_calls.add(1, {"stage": stage})
+    _llm_tokens.add(prompt_tokens, {"stage": stage, "type": "prompt"})
+    _llm_tokens.add(completion_tokens, {"stage": stage, "type": "completion"})
+    _llm_tokens.add(cached_tokens, {"stage": stage, "type": "cached"})
+
+    tracker = current_tracker()
+    if tracker:
+        tracker.add(stage, prompt_tokens, completion_tokens, cached_tokens)
@@ -36,7 +36,27 @@ export interface SearchResult {
     search_results_from_cache: boolean;
     competitors_from_cache: string[];
     fresh_competitors: string[];
+    refreshed_sections: Record<string, string[]>;
     last_cache_update?: Date;
+    deadline_exceeded: boolean;
+    skipped_competitors: string[];
+    pending_competitors: string[];
+    skipped_sections: string[];
+    pending_sections: string[];
+  }
+  
+  export interface TokenUsage {
+    calls: number;
+    prompt_tokens: number;
+    completion_tokens: number;
+    cached_tokens: number;
+    total_tokens: number;
+  }
+  
+  export interface Diagnostics {
+    token_usage: Record<string, TokenUsage>;
+    total_usage: TokenUsage;
+    tokens_saved_by_cache: number;
   }
   
   export interface SearchResponse {
@@ -45,4 +65,18 @@ export interface SearchResult {
     swot_analysis: SwotAnalysis;
     comparison?: ComparisonResult;
     data_source_info: DataSourceInfo;
-  }
\ No newline at end of file
+    diagnostics?: Diagnostics;
+  }
+  
+  export interface SimilarCompetitor {
+    name: string;
+    website: string;
+    industry: string;
+    similarity: number;
+  }
+
+  export interface SimilarCompetitorsResponse {
+    to: string;
+    industry?: string;
+    competitors: SimilarCompetitor[];
+  }
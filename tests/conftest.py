@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+# Tests import the app's packages (scraper, models, agents) from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def fresh_chroma_clients():
+    """
+    Chroma reuses clients by path, and DBManager always opens "./data", so
+    tests working in different directories would share a database
+    """
+    from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+    yield
+    SharedSystemClient.clear_system_cache()
@@ -0,0 +1,46 @@
+"""In-memory cache access counts used for prewarming"""
+import asyncio
+from datetime import datetime, timedelta
+from scraper.db_manager import DBManager
+
+def test_access_not_tracked_without_prewarming(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("CACHE_PREWARM_ENABLED", raising=False)
+    db = DBManager()
+    for i in range(5):
+        db._record_access("search", f"query {i}", datetime.utcnow() + timedelta(days=1))
+    assert db._pending_access == {}
+
+def test_access_flushed_past_cap(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CACHE_PREWARM_ENABLED", "1")
+    monkeypatch.setenv("ACCESS_STATS_MAX_PENDING", "3")
+    db = DBManager()
+    for i in range(4):
+        db._record_access("search", f"query {i}", datetime.utcnow() + timedelta(days=1))
+    assert len(db._pending_access) == 1
+    assert db.cache_access_collection.count() == 3
+
+def test_prewarm_candidates_weight_recent_hits(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CACHE_PREWARM_ENABLED", "1")
+    monkeypatch.setenv("ACCESS_STATS_HALF_LIFE_DAYS", "7")
+    db = DBManager()
+    now = datetime.utcnow()
+    expires_at = now + timedelta(hours=1)
+    # Popular two months ago, hits are now worth 100 / 2**(60/7) < 1
+    db._record_access("search", "old favourite", expires_at, hits=100)
+    db._pending_access[db._generate_id("search:old favourite")]["last_access"] = (now - timedelta(days=60)).isoformat()
+    db._record_access("search", "current", expires_at, hits=10)
+    db._flush_pending_access()
+
+    candidates = asyncio.run(db.get_prewarm_candidates(10, timedelta(days=1), accessed_within=timedelta(days=90)))
+    assert [candidate["key"] for candidate in candidates] == ["current", "old favourite"]
+
+def test_requested_num_results_recorded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CACHE_PREWARM_ENABLED", "1")
+    db = DBManager()
+    asyncio.run(db.store_search_results("crm tools", [{"title": "CRM", "last_updated": datetime.utcnow().isoformat()}]))
+    asyncio.run(db.get_search_results_document("crm tools", num_results=10))
+    assert next(iter(db._pending_access.values()))["num_results"] == 10
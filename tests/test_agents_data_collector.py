@@ -0,0 +1,29 @@
+"""Latency budget of DataCollectorAgent.collect_data"""
+import asyncio
+from agents.data_collector import DataCollectorAgent
+from models.request import AnalysisRequest
+
+def test_pending_sources_finish_cancelling_before_session_closes(monkeypatch):
+    monkeypatch.setenv("CRUNCHBASE_API_KEY", "test")
+    monkeypatch.setenv("G2_API_KEY", "test")
+    agent = DataCollectorAgent()
+    session_open_when_cancelled = []
+
+    async def fast(session, request):
+        return {"error": "no data"}
+
+    async def slow(session, request):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            session_open_when_cancelled.append(not session.closed)
+            raise
+
+    agent._fetch_crunchbase_data = fast
+    agent._fetch_linkedin_data = slow
+    agent._fetch_g2_data = slow
+
+    request = AnalysisRequest(query="crm tools", latency_budget_ms=100)
+    data = asyncio.run(agent.collect_data(request))
+    assert data["pending_sources"] == ["linkedin", "g2"]
+    assert session_open_when_cancelled == [True, True]
@@ -0,0 +1,204 @@
+"""Cached competitor profiles and search results"""
+import asyncio
+import threading
+import orjson
+from datetime import datetime, timedelta
+import pytest
+from scraper.data_collector import DataCollector, PROFILE_SECTION_MODELS
+from models.request import AnalysisRequest
+from models.response import SearchResponse, SwotAnalysis
+from scraper import db_manager
+from scraper.db_manager import ANALYSIS_FAILED, PROFILE_SECTIONS
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("OPENAI_API_KEY", "GOOGLE_API_KEY", "GOOGLE_SEARCH_ID", "GOOGLE_CUSTOM_SEARCH_URL"):
+        monkeypatch.setenv(name, "test")
+    monkeypatch.setenv("CACHE_PREWARM_ENABLED", "1")
+    return DataCollector()
+
+def make_profile(name: str, website: str) -> dict:
+    return {
+        "company_info": {"name": name, "website": website, "industry": "CRM",
+                         "founded_year": None, "location": None, "founders": None},
+        "market_position": {"target_audience": ["sales teams"], "brand_reputation": "good",
+                            "value_propositions": ["pipeline tracking"]},
+        "product_service": {"features": ["contacts"], "pricing": {}, "differentiators": []},
+        "online_presence": {"website_traffic": None, "domain_authority": None,
+                            "social_media": {}, "content_strategy": None},
+        "customer_sentiment": {"positive_feedback": [], "negative_feedback": [],
+                               "common_pain_points": [], "praise_points": []},
+        "business_growth": {"funding_rounds": None, "revenue_estimates": None,
+                            "partnerships": [], "market_growth": "steady"},
+        "tech_stack": {"tools": [], "ai_ml_usage": None, "frameworks": [], "platform_details": "web"},
+        "marketing_strategy": {"campaigns": [], "channels": [], "positioning": "simple",
+                               "engagement_metrics": None},
+        "last_updated": datetime.utcnow().isoformat(),
+        "data_source": "cached"
+    }
+
+def make_failed_profile(name: str) -> dict:
+    failed = make_profile(name, "Error")
+    failed["market_position"]["value_propositions"] = [ANALYSIS_FAILED]
+    return failed
+
+def store_with_stale_sentiment(db, key: str, sentiment_age: timedelta) -> datetime:
+    """Store a profile whose customer_sentiment section was generated sentiment_age ago"""
+    updated = datetime.utcnow() - sentiment_age
+    asyncio.run(db.store_competitor_data(
+        make_profile("Acme", key),
+        identifier=key,
+        refreshed_sections=[section for section in PROFILE_SECTIONS if section != "customer_sentiment"],
+        previous_metadata={"updated_customer_sentiment": updated.isoformat()}
+    ))
+    return updated
+
+def test_failed_partial_refresh_backs_off(collector):
+    db = collector.db_manager
+    key = "https://acme.example"
+    store_with_stale_sentiment(db, key, timedelta(days=30))
+    attempts = []
+
+    async def failing_refresh(competitor, data, stale):
+        attempts.append(stale)
+        return None
+
+    collector._refresh_profile_sections = failing_refresh
+    for _ in range(3):
+        cached = asyncio.run(db.get_competitor_document(key, record_access=False))
+        profile = asyncio.run(collector.refresh_competitor(key, cached))
+        assert profile.company_info.name == "Acme"
+    assert attempts == [["customer_sentiment"]]
+
+def test_refresh_expiry_follows_oldest_section(collector):
+    db = collector.db_manager
+    key = "https://acme.example"
+    updated = store_with_stale_sentiment(db, key, timedelta(days=3))
+    asyncio.run(db.record_refresh("competitor", key))
+    pending = next(iter(db._pending_access.values()))
+    assert datetime.fromisoformat(pending["expires_at"]) == updated + timedelta(days=7)
+
+def test_similar_competitors_skip_failed_analyses_and_duplicates(collector):
+    db = collector.db_manager
+    vectors = {"Acme": [1.0, 0.0, 0.0], "Beta": [0.9, 0.1, 0.0], "Gamma": [0.8, 0.2, 0.0], "Broken": [1.0, 0.01, 0.0]}
+
+    async def create_embeddings(texts):
+        return [next(v for name, v in vectors.items() if name in text) for text in texts]
+
+    collector._create_embeddings = create_embeddings
+    failed = make_failed_profile("Broken")
+    # Acme and Gamma are each cached under their name and their URL
+    profiles = [
+        ("Acme", make_profile("Acme", "https://acme.example")),
+        ("https://www.acme.example", make_profile("Acme", "https://www.acme.example")),
+        ("Beta", make_profile("Beta", "https://beta.example")),
+        ("Gamma", make_profile("Gamma", "https://gamma.example")),
+        ("https://gamma.example/", make_profile("Gamma", "https://gamma.example/")),
+        ("Broken", failed)
+    ]
+    asyncio.run(collector.index_competitors([(db.competitor_document_id(key), data) for key, data in profiles]))
+
+    response = asyncio.run(collector.find_similar_competitors("Acme", k=5))
+    assert [competitor.name for competitor in response.competitors] == ["Beta", "Gamma"]
+
+def search_result(title: str) -> dict:
+    return {"title": title, "url": f"https://{title.lower()}.example", "snippet": title, "analysis": ""}
+
+def test_cache_check_runs_off_the_event_loop(collector):
+    db = collector.db_manager
+    key = "https://acme.example"
+    asyncio.run(db.store_search_results("crm tools", [search_result("CRM")]))
+    store_with_stale_sentiment(db, key, timedelta(days=1))
+    threads = []
+    is_cached = db._is_cached
+
+    def recording_is_cached(*args):
+        threads.append(threading.get_ident())
+        return is_cached(*args)
+
+    db._is_cached = recording_is_cached
+    assert asyncio.run(db.is_cached("crm tools", [key]))
+    assert not asyncio.run(db.is_cached("crm tools", [key, "https://beta.example"]))
+    assert threading.get_ident() not in threads
+
+def test_cache_check_needs_results_and_usable_profiles(collector):
+    db = collector.db_manager
+    asyncio.run(db.store_search_results("crm tools", []))
+    assert not asyncio.run(db.is_cached("crm tools", []))
+
+    asyncio.run(db.store_search_results("crm tools", [search_result("CRM")]))
+    assert asyncio.run(db.is_cached("crm tools", []))
+    asyncio.run(db.store_competitor_data(make_failed_profile("Acme"), identifier="Acme"))
+    assert not asyncio.run(db.is_cached("crm tools", ["Acme"]))
+    # A successful analysis replaces the placeholder
+    asyncio.run(db.store_competitor_data(make_profile("Acme", "https://acme.example"), identifier="Acme"))
+    assert asyncio.run(db.is_cached("crm tools", ["Acme"]))
+    store_with_stale_sentiment(db, "Beta", timedelta(days=30))
+    assert not asyncio.run(db.is_cached("crm tools", ["Acme", "Beta"]))
+
+def test_cache_hits_spliced_into_the_response(collector):
+    db = collector.db_manager
+    now = datetime.utcnow().isoformat()
+    results = [{"title": "CRM", "url": "https://crm.example", "snippet": "A CRM", "analysis": "Good",
+                "data_source": "cached", "last_updated": now}]
+    asyncio.run(db.store_search_results("crm tools", results))
+    # Stored before data_source was written as 'cached'
+    legacy = {**make_profile("Acme", "https://acme.example"), "data_source": "new"}
+    asyncio.run(db.store_competitor_data(legacy, identifier="https://acme.example"))
+
+    async def swot(query, results, profiles):
+        return SwotAnalysis(strengths=["s"], weaknesses=[], opportunities=[], threats=[])
+
+    async def competitive(results, profiles, advantages):
+        return ["a"] if advantages else []
+
+    collector._generate_swot_analysis = swot
+    collector._generate_competitive_analysis = competitive
+    request = AnalysisRequest(query="crm tools", num_results=1, competitors=["https://acme.example"])
+    content = asyncio.run(collector.collect_data_json(request))
+
+    response = SearchResponse.model_validate_json(content)
+    assert response.data_source_info.search_results_from_cache
+    assert response.data_source_info.competitors_from_cache == ["https://acme.example"]
+    raw = orjson.loads(content)
+    assert [{k: v for k, v in r.items() if k != "last_updated"} for r in raw["results"]] == \
+        [{k: v for k, v in r.items() if k != "last_updated"} for r in results]
+    competitor = raw["comparison"]["competitors"][0]
+    assert competitor["data_source"] == "cached"
+    assert competitor["company_info"] == legacy["company_info"]
+    assert response.comparison.competitive_advantages == ["a"]
+
+def test_failed_analysis_refreshed_in_full(collector, monkeypatch):
+    db = collector.db_manager
+    asyncio.run(db.store_competitor_data(make_failed_profile("Acme"), identifier="Acme"))
+    data, _, metadata = asyncio.run(db.get_competitor_document("Acme", record_access=False))
+    assert db.stale_sections(data, metadata) == []
+    assert db.stale_sections(data, metadata, within=timedelta(hours=1)) == PROFILE_SECTIONS
+
+    analyzed = []
+
+    async def get_company_url(competitor):
+        return "https://acme.example"
+
+    async def generate_profile_sections(website, sections, known=None):
+        analyzed.append((website, sections, known))
+        good = make_profile("Acme", website)
+        return {section: PROFILE_SECTION_MODELS[section](**good[section]) for section in sections}
+
+    collector._get_company_url = get_company_url
+    collector._generate_profile_sections = generate_profile_sections
+    # Ahead of its expiry, e.g. when prewarming
+    cached = asyncio.run(db.get_competitor_document("Acme", record_access=False))
+    profile = asyncio.run(collector.refresh_competitor("Acme", cached, within=timedelta(hours=1)))
+    assert profile.company_info.website == "https://acme.example"
+    assert analyzed == [("https://acme.example", PROFILE_SECTIONS, None)]
+
+    # Once expired, the placeholder is dropped and analyzed again on request
+    asyncio.run(db.store_competitor_data(make_failed_profile("Beta"), identifier="Beta"))
+    monkeypatch.setattr(db_manager, "PROFILE_REFRESH_RETRY_MINUTES", 0)
+    assert asyncio.run(db.get_competitor_document("Beta", record_access=False)) is None
+    profile, _, cached_metadata, _ = asyncio.run(collector._load_competitor("Beta"))
+    assert cached_metadata is None
+    assert profile.market_position.value_propositions == ["pipeline tracking"]
+    assert len(analyzed) == 2
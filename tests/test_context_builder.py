@@ -0,0 +1,63 @@
+"""Token budget, ranking and de-duplication of prompt context"""
+from types import SimpleNamespace
+from models.response import SearchResult
+from scraper.context_builder import (
+    ContextBuilder, SWOT_PROFILE_FIELDS, SWOT_RESULT_FIELDS, estimate_tokens
+)
+
+def result(title: str, snippet: str, analysis: str = "") -> SearchResult:
+    return SearchResult(title=title, url=f"https://{title.lower().replace(' ', '-')}.example",
+                        snippet=snippet, analysis=analysis)
+
+def profile(name: str, features: int = 5) -> SimpleNamespace:
+    return SimpleNamespace(
+        company_info=SimpleNamespace(name=name, industry="CRM"),
+        market_position=SimpleNamespace(target_audience=["sales teams"], value_propositions=["speed"]),
+        product_service=SimpleNamespace(features=[f"feature {i} " * 10 for i in range(features)])
+    )
+
+def test_results_ranked_by_query_terms_and_deduplicated():
+    results = [
+        result("Unrelated", "Nothing to see"),
+        result("CRM pricing", "Compare CRM pricing plans"),
+        result("CRM pricing copy", "Compare  CRM pricing plans "),
+        result("CRM", "A CRM tool"),
+    ]
+    content, stats = ContextBuilder().build(results, [], SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS, query="crm pricing")
+    titles = [line[len("Title: "):] for line in content.splitlines() if line.startswith("Title: ")]
+    assert titles == ["CRM pricing", "CRM", "Unrelated"]
+    assert stats["duplicates_removed"] == 1
+    assert stats["results_included"] == 3
+
+def test_fields_repeating_another_are_skipped():
+    content, _ = ContextBuilder().build(
+        [result("CRM", "A CRM tool", analysis="a crm tool")], [], SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS
+    )
+    assert "Analysis:" not in content
+
+def test_profiles_come_first_in_the_budget_but_leave_room_for_results():
+    builder = ContextBuilder(max_tokens=600, result_share=0.4)
+    results = [result(f"Result {i}", f"snippet number {i} " * 20) for i in range(10)]
+    profiles = [profile(f"Company {i}") for i in range(8)]
+    content, stats = builder.build(results, profiles, SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS)
+
+    result_cost = estimate_tokens(builder._format_result(results[0], SWOT_RESULT_FIELDS, {"chars_trimmed": 0}))
+    assert stats["results_included"] >= int(600 * 0.4) // result_cost
+    assert stats["profiles_included"] >= 1 and stats["profiles_dropped"] >= 1
+    assert stats["estimated_tokens"] <= builder.max_tokens
+    # Results are rendered first, then the profiles
+    assert content.index("Search Results:") < content.index("Competitor Profiles:")
+
+def test_profiles_use_the_whole_budget_without_results():
+    builder = ContextBuilder(max_tokens=600, result_share=0.4)
+    profiles = [profile(f"Company {i}") for i in range(5)]
+    block = builder._format_profile(profiles[0], SWOT_PROFILE_FIELDS, {"chars_trimmed": 0})
+    _, stats = builder.build([], profiles, SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS)
+    headings = estimate_tokens("Search Results:\n\nCompetitor Profiles:\n")
+    assert stats["profiles_included"] == (600 - headings) // estimate_tokens(block)
+
+def test_long_fields_trimmed_and_counted():
+    builder = ContextBuilder(max_field_chars=20)
+    content, stats = builder.build([result("CRM", "x" * 50)], [], SWOT_RESULT_FIELDS, SWOT_PROFILE_FIELDS)
+    assert "Snippet: " + "x" * 20 + "..." in content
+    assert stats["chars_trimmed"] == 30
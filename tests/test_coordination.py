@@ -0,0 +1,28 @@
+"""Rate limits shared between workers"""
+import asyncio
+import struct
+import threading
+import time
+from scraper.coordination import RateLimiter
+
+def test_concurrent_reservations_get_distinct_slots(tmp_path):
+    limiter = RateLimiter("test", str(tmp_path), rate=100, burst=1)
+    threads = set()
+    reserve = limiter._reserve
+
+    def recording_reserve():
+        threads.add(threading.get_ident())
+        return reserve()
+
+    limiter._reserve = recording_reserve
+
+    async def run():
+        await asyncio.gather(*(limiter.acquire() for _ in range(20)))
+
+    start = time.time()
+    asyncio.run(run())
+    assert threading.get_ident() not in threads
+    # Every reservation moved the next free slot on by one interval
+    with open(limiter.path, "rb") as f:
+        (next_free,) = struct.unpack("d", f.read(8))
+    assert 0.2 <= next_free - start < 0.25
@@ -0,0 +1,67 @@
+"""Staged pipeline of CompetitorAnalysisCoordinator, run with stub agents"""
+import asyncio
+import pytest
+
+# The real agents import langchain
+pytest.importorskip("langchain_openai")
+from agents.coordinator import CompetitorAnalysisCoordinator
+from models.request import AnalysisRequest
+from scraper.deadline import DeadlineExceeded
+
+class StubStage:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def run(self, data):
+        await asyncio.sleep(self.delay)
+        return data
+
+def make_coordinator(collect=0.01, analyze=0.01, report=0.01, **kwargs):
+    collector, analyzer, reporter = StubStage(collect), StubStage(analyze), StubStage(report)
+    collector.collect_data = collector.run
+    analyzer.analyze = analyzer.run
+    reporter.generate_report = reporter.run
+    return CompetitorAnalysisCoordinator(collector, analyzer, reporter, **kwargs)
+
+def test_requests_run_through_all_stages():
+    async def run():
+        coordinator = make_coordinator()
+        results = await asyncio.gather(*(
+            coordinator.run_analysis(AnalysisRequest(query=f"query {i}")) for i in range(5)
+        ))
+        await coordinator.stop()
+        return [result.query for result in results]
+
+    assert asyncio.run(run()) == [f"query {i}" for i in range(5)]
+
+def test_stop_cancels_requests_in_flight():
+    async def run():
+        # One slow worker per stage and tiny queues, so that at stop() some
+        # requests are being processed, some are blocked handing off to the
+        # next stage and some are still waiting to be submitted
+        coordinator = make_coordinator(
+            collect=0.01, analyze=10,
+            collector_workers=1, analyzer_workers=1, report_workers=1, queue_size=1
+        )
+        requests = [
+            asyncio.create_task(coordinator.run_analysis(AnalysisRequest(query=f"query {i}")))
+            for i in range(6)
+        ]
+        await asyncio.sleep(0.1)
+        await coordinator.stop()
+        return await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), timeout=1)
+
+    outcomes = asyncio.run(run())
+    assert all(isinstance(outcome, asyncio.CancelledError) for outcome in outcomes)
+
+def test_latency_budget_covers_every_stage():
+    async def run():
+        coordinator = make_coordinator(collect=0.05, analyze=10)
+        start = asyncio.get_running_loop().time()
+        with pytest.raises(DeadlineExceeded):
+            await coordinator.run_analysis(AnalysisRequest(query="slow", latency_budget_ms=200))
+        elapsed = asyncio.get_running_loop().time() - start
+        await coordinator.stop()
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
@@ -0,0 +1,102 @@
+"""DBManager against a database written by the original code"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+import chromadb
+from scraper.db_manager import (
+    DBManager, DOCUMENT_FORMAT_VERSION, _DOCUMENT_HEADER, decode_document, encode_document
+)
+
+# The default embedding model's vector size, which the original collections have
+DEFAULT_DIMENSION = 384
+
+def doc_id(key: str) -> str:
+    return hashlib.md5(key.encode()).hexdigest()
+
+def write_legacy_database(path):
+    """Store a profile and search results the way the original DBManager did"""
+    client = chromadb.PersistentClient(path=str(path))
+    now = datetime.utcnow().isoformat()
+    competitors = client.get_or_create_collection("competitors", embedding_function=None)
+    competitors.add(
+        ids=[doc_id("https://example.com")],
+        embeddings=[[0.1] * DEFAULT_DIMENSION],
+        documents=[json.dumps({
+            "company_info": {"name": "Example", "website": "https://example.com", "industry": "Software"},
+            "last_updated": now
+        })],
+        metadatas=[{"name": "Example", "website": "https://example.com", "stored_at": now}]
+    )
+    search_results = client.get_or_create_collection("search_results", embedding_function=None)
+    search_results.add(
+        ids=[doc_id("crm tools")],
+        embeddings=[[0.1] * DEFAULT_DIMENSION],
+        documents=[json.dumps([{"title": "CRM", "link": "https://example.com", "last_updated": now}])],
+        metadatas=[{"query": "crm tools", "stored_at": now}]
+    )
+
+def test_upgrade_legacy_database(tmp_path, monkeypatch):
+    write_legacy_database(tmp_path / "data")
+    monkeypatch.chdir(tmp_path)
+    db = DBManager()
+
+    async def run():
+        profile = await db.get_competitor_data("https://example.com")
+        assert profile["company_info"]["name"] == "Example"
+        results = await db.get_search_results("crm tools")
+        assert results[0]["title"] == "CRM"
+
+        # Read documents are rewritten in the current format
+        for collection, key in [(db.competitors_collection, "https://example.com"),
+                                (db.search_results_collection, "crm tools")]:
+            stored = collection.get(ids=[db._generate_id(key)], include=['metadatas'])
+            assert stored['metadatas'][0]['format_version'] == DOCUMENT_FORMAT_VERSION
+        stats = await db.get_storage_stats()
+        assert stats["competitors"]["legacy_documents"] == stats["search_results"]["legacy_documents"] == 0
+
+        # New writes go into the existing collections
+        assert await db.store_competitor_data(
+            {"company_info": {"name": "Other", "website": "https://other.com", "industry": "Software"}}
+        )
+        assert (await db.get_competitor_data("https://other.com"))["company_info"]["name"] == "Other"
+        assert await db.store_search_results("erp", [{"title": "ERP", "link": "https://other.com"}])
+        assert (await db.get_search_results("erp"))[0]["title"] == "ERP"
+
+    asyncio.run(run())
+
+def test_company_urls_use_the_document_format(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path / "data"))
+    company_urls = client.get_or_create_collection("company_urls", embedding_function=None)
+    company_urls.add(
+        ids=[doc_id("legacy")],
+        embeddings=[[0.1] * DEFAULT_DIMENSION],
+        documents=[json.dumps({"name": "Legacy", "website": "https://legacy.example",
+                               "last_updated": datetime.utcnow().isoformat()})],
+        metadatas=[{"key": "legacy", "website": "https://legacy.example"}]
+    )
+    monkeypatch.chdir(tmp_path)
+    db = DBManager()
+
+    async def run():
+        assert await db.import_company_urls([{"name": "Imported Inc", "website": "https://imported.example"}])
+        assert (await db.get_company_url("Imported"))["website"] == "https://imported.example"
+        # Reading the legacy entry migrates it
+        assert (await db.get_company_url("Legacy"))["website"] == "https://legacy.example"
+        stats = await db.get_storage_stats()
+        assert stats["company_urls"]["documents"] == 2
+        assert stats["company_urls"]["legacy_documents"] == 0
+
+    asyncio.run(run())
+
+def test_documents_compressed_only_when_smaller():
+    small = {"title": "CRM"}
+    document, raw_bytes = encode_document(small)
+    assert document == '{"title":"CRM"}' and raw_bytes == len(document)
+    assert decode_document(document, {"format_version": DOCUMENT_FORMAT_VERSION}) == (document.encode(), False)
+
+    large = [{"title": "CRM", "snippet": "customer relationship management " * 10}] * 10
+    document, raw_bytes = encode_document(large)
+    assert document.startswith(_DOCUMENT_HEADER) and len(document) < raw_bytes
+    raw, legacy = decode_document(document)
+    assert json.loads(raw) == large and not legacy
@@ -0,0 +1,39 @@
+"""Per-request latency budgets"""
+import asyncio
+import pytest
+from scraper.deadline import Deadline, DeadlineExceeded
+
+def test_stage_cancelled_when_budget_runs_out():
+    cancelled = []
+
+    async def slow_stage():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(Deadline(0.05).run(slow_stage()))
+    assert cancelled == [True]
+
+def test_stage_timeouts_are_not_deadlines():
+    async def timing_out_stage():
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(Deadline(10).run(timing_out_stage()))
+
+def test_company_url_lookup_stops_at_the_deadline(tmp_path, monkeypatch):
+    from scraper.data_collector import DataCollector
+    monkeypatch.chdir(tmp_path)
+    for name in ("OPENAI_API_KEY", "GOOGLE_API_KEY", "GOOGLE_SEARCH_ID", "GOOGLE_CUSTOM_SEARCH_URL"):
+        monkeypatch.setenv(name, "test")
+    collector = DataCollector()
+
+    async def expired_throttle(upstream):
+        raise DeadlineExceeded()
+
+    collector.coordinator.throttle = expired_throttle
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(collector._get_company_url("Acme"))
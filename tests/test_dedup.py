@@ -0,0 +1,48 @@
+"""Near-duplicate detection of search results"""
+from scraper.dedup import (
+    NUM_PERMUTATIONS, canonical_url, group_near_duplicates, minhash, shingles, similarity
+)
+
+def item(link: str, title: str, snippet: str) -> dict:
+    return {"link": link, "title": title, "snippet": snippet}
+
+def test_canonical_url_drops_tracking_parameters():
+    assert canonical_url("https://www.Example.com/pricing/?utm_source=x&gclid=1&plan=pro&b=2") == \
+        "example.com/pricing?b=2&plan=pro"
+    assert canonical_url("http://example.com") == canonical_url("https://www.example.com/") == "example.com/"
+    assert canonical_url("https://example.com/pricing?plan=pro") != canonical_url("https://example.com/pricing?plan=team")
+
+def test_minhash_estimates_jaccard_similarity():
+    text = "project management software for small teams with boards and reports"
+    assert minhash(set()) is None
+    assert similarity(minhash(shingles(text)), None) == 0.0
+    assert similarity(minhash(shingles(text)), minhash(shingles(text.upper()))) == 1.0
+    assert similarity(minhash(shingles(text)), minhash(shingles("unrelated words about cooking pasta at home"))) < 0.2
+
+def test_same_canonical_url_grouped():
+    items = [
+        item("https://example.com/crm", "CRM", "First"),
+        item("https://other.com/crm", "CRM", "Something else entirely"),
+        item("https://www.example.com/crm/?utm_medium=ad", "Other title", "Other snippet"),
+    ]
+    assert group_near_duplicates(items) == [0, 1, 0]
+
+def test_content_threshold_boundary():
+    a = item("https://a.com/1", "Best CRM tools", "Compare the best CRM tools for small business sales teams in 2024")
+    b = item("https://b.com/2", "Best CRM tools", "Compare the best CRM tools for small business sales teams in 2025")
+    score = similarity(
+        minhash(shingles(f"{a['title']} {a['snippet']}")),
+        minhash(shingles(f"{b['title']} {b['snippet']}"))
+    )
+    assert 0 < score < 1
+    assert group_near_duplicates([a, b], content_threshold=score) == [0, 0]
+    assert group_near_duplicates([a, b], content_threshold=score + 1 / NUM_PERMUTATIONS) == [0, 1]
+
+def test_same_domain_uses_the_lower_threshold():
+    snippet_a = "Pricing plans for teams of every size with a free trial and monthly billing"
+    snippet_b = "Pricing plans for teams of every size with a free trial and annual billing discounts"
+    score = similarity(minhash(shingles(snippet_a)), minhash(shingles(snippet_b)))
+    same_site = [item("https://a.com/pricing", "Pricing", snippet_a), item("https://a.com/plans", "Plans", snippet_b)]
+    other_site = [same_site[0], item("https://b.com/plans", "Plans", snippet_b)]
+    assert group_near_duplicates(same_site, content_threshold=1.0, same_domain_threshold=score) == [0, 0]
+    assert group_near_duplicates(other_site, content_threshold=1.0, same_domain_threshold=score) == [0, 1]
@@ -0,0 +1,41 @@
+"""Hedged calls of Hedger.run"""
+import asyncio
+import pytest
+from scraper.hedging import Hedger
+
+def test_failed_calls_not_counted_in_latencies():
+    hedger = Hedger(enabled=True, min_samples=1)
+
+    async def fail():
+        raise ValueError("upstream error")
+
+    async def succeed():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await hedger.run("op", fail)
+        assert hedger.delay("op") is None
+        assert await hedger.run("op", succeed) == "ok"
+
+    asyncio.run(run())
+    assert len(hedger._stats["op"].latencies) == 1
+
+def test_slow_call_is_hedged():
+    hedger = Hedger(enabled=True, min_samples=5, max_rate=1.0)
+    calls = []
+
+    async def call():
+        calls.append(None)
+        # The first call after warm-up is slow, its hedge is fast
+        await asyncio.sleep(1 if len(calls) == 6 else 0.01)
+        return len(calls)
+
+    async def run():
+        for _ in range(5):
+            await hedger.run("op", call)
+        return await asyncio.wait_for(hedger.run("op", call), timeout=0.5)
+
+    assert asyncio.run(run()) == 7
@@ -0,0 +1,55 @@
+"""HTTP behaviour of the API that doesn't need the data collector"""
+import asyncio
+from fastapi.testclient import TestClient
+import main
+
+def test_search_before_startup_is_unavailable():
+    # Without the context manager, lifespan startup doesn't run
+    client = TestClient(main.app)
+    response = client.post("/search", json={"query": "crm tools"})
+    assert response.status_code == 503
+    assert client.get("/competitors/similar", params={"to": "https://example.com"}).status_code == 503
+    assert client.get("/ready").status_code == 503
+
+def test_search_while_initializing_is_unavailable(monkeypatch):
+    loop = asyncio.new_event_loop()
+    initializing = loop.create_future()
+    monkeypatch.setattr(main, "_collector_task", initializing)
+    client = TestClient(main.app)
+    response = client.post("/search", json={"query": "crm tools"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(main.STARTUP_RETRY_AFTER_SECONDS)
+
+    initializing.set_exception(RuntimeError("Chroma unavailable"))
+    response = client.post("/search", json={"query": "crm tools"})
+    assert response.status_code == 503
+    assert "Chroma unavailable" in response.json()["detail"]
+    assert "Retry-After" not in response.headers
+    loop.close()
+
+def test_shutdown_waits_for_the_index_backfill(monkeypatch):
+    cancelled = []
+
+    async def backfill():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            await asyncio.sleep(0)
+            cancelled.append(True)
+            raise
+
+    async def initialize():
+        main._backfill_task = asyncio.create_task(backfill())
+        await asyncio.sleep(10)
+
+    async def run():
+        async with main.lifespan(main.app):
+            await asyncio.sleep(0.01)
+        return main._backfill_task.cancelled()
+
+    monkeypatch.setattr(main, "_initialize", initialize)
+    monkeypatch.setattr(main, "_backfill_task", None)
+    monkeypatch.setattr(main, "_collector_task", None)
+    monkeypatch.setattr(main, "prewarmer", None)
+    assert asyncio.run(run())
+    assert cancelled == [True]
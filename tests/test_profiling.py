@@ -0,0 +1,38 @@
+"""Saving and pruning request profiles"""
+import asyncio
+import os
+import time
+from scraper import profiling
+
+def run_profiled() -> dict:
+    async def request():
+        async with profiling.profile_request("/search test") as profile:
+            await asyncio.sleep(0.05)
+        return profiling.load_profile(profile.id)
+    return asyncio.run(request())
+
+def test_profile_saved_and_old_profiles_pruned(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILING_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILING_INTERVAL_MS", "1")
+    monkeypatch.setenv("PROFILING_MAX_PROFILES", "3")
+    monkeypatch.setenv("PROFILING_MAX_AGE_HOURS", "1")
+    now = time.time()
+    for i, age in enumerate([7200, 60, 50, 40]):
+        path = tmp_path / f"old{i}.json"
+        path.write_text("{}")
+        os.utime(path, (now - age, now - age))
+
+    profile = run_profiled()
+    assert profile["samples"]["attributed"]
+    assert profile["samples"]["no_task"] > 0
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{profile['id']}.json", "old2.json", "old3.json"])
+
+def test_samples_kept_without_task_attribution(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILING_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILING_INTERVAL_MS", "1")
+    monkeypatch.setattr(profiling, "_current_tasks", None)
+
+    profile = run_profiled()
+    assert not profile["samples"]["attributed"]
+    assert profile["samples"]["total"] > 0
+    assert profile["samples"]["no_task"] == profile["samples"]["other_tasks"] == 0
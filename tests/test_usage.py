@@ -0,0 +1,44 @@
+"""Per-request accounting of OpenAI token usage"""
+import asyncio
+from types import SimpleNamespace
+from scraper.usage import UsageTracker, current_tracker, record_llm_usage
+
+def chat_usage(prompt: int, completion: int, cached: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion,
+                           prompt_tokens_details=SimpleNamespace(cached_tokens=cached))
+
+def test_nested_trackers_add_up():
+    with UsageTracker() as request:
+        record_llm_usage("search_analysis", chat_usage(100, 20, cached=50))
+        with UsageTracker() as stage:
+            record_llm_usage("swot_analysis", chat_usage(300, 100))
+            record_llm_usage("swot_analysis", chat_usage(200, 50))
+        # Embeddings responses have no completion tokens or details
+        record_llm_usage("embeddings", SimpleNamespace(prompt_tokens=40))
+    assert current_tracker() is None
+
+    assert stage.total_tokens() == 650
+    assert stage.diagnostics.token_usage["swot_analysis"].calls == 2
+    assert request.total_tokens() == 120 + 650 + 40
+    assert request.diagnostics.total_usage.calls == 4
+    assert request.diagnostics.total_usage.cached_tokens == 50
+    assert request.diagnostics.token_usage["swot_analysis"].prompt_tokens == 500
+    assert request.diagnostics.token_usage["embeddings"].completion_tokens == 0
+
+def test_concurrent_requests_are_tracked_separately():
+    async def handle(tokens: int) -> int:
+        with UsageTracker() as tracker:
+            await asyncio.sleep(0.01)
+            record_llm_usage("search_analysis", chat_usage(tokens, 0))
+            await asyncio.sleep(0.01)
+        return tracker.total_tokens()
+
+    async def run():
+        return await asyncio.gather(handle(10), handle(20), handle(30))
+
+    assert asyncio.run(run()) == [10, 20, 30]
+
+def test_usage_without_tracker_is_only_counted_in_metrics():
+    record_llm_usage("search_analysis", chat_usage(10, 5))
+    record_llm_usage("search_analysis", None)
+    assert current_tracker() is None